@@ -0,0 +1,419 @@
+"""Исправление оформления: исправленная копия .docx по профилю требований.
+
+Исправляется то же, что находят проверки: шрифт и размер фрагментов (прямое
+форматирование w:r), отступ первой строки и межстрочный интервал абзацев,
+поля каждого раздела. Где применяются правила, задают font_in и
+paragraph_format_in профиля — как при проверке.
+
+word/document.xml переписывается потоково: элементы тела читаются iterparse,
+исправляются и сразу пишутся в новый архив, поэтому память
+не растет с длиной документа. Колонтитулы (небольшие части) разбираются целиком
+и перезаписываются, только если в них что-то исправлено. Остальные части
+копируются без разбора. Исходный файл не изменяется: копия пишется во временный
+файл рядом с целевым и переименовывается в конце.
+
+    python autofix.py ./theses --out-dir ./fixed -j 8
+    python autofix.py work.docx                 # -> work.fixed.docx
+"""
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+from lxml import etree
+
+from batch_check import collect_files, run_pool
+from findings import RULE_FONT, RULE_MARGINS, RULE_PARAGRAPH
+from ooxml import RT_FOOTER, RT_HEADER, w
+from rule_profiles import rule_set
+from stream_engine import StreamingDocument
+from traversal import (BodyWalker, PART_FOOTER, PART_HEADER, W_BODY, W_P, W_PPR, W_R, W_RPR, W_SDT, W_SECTPR,
+                       W_TBL, container_of, paragraph_records, section_record)
+
+FIXED_SUFFIX = '.fixed.docx'
+# Статусы результатов fix_file в журнале
+STATUS_LABELS = {'fixed': 'FIXED', 'clean': 'OK', 'error': 'ERROR'}
+
+W_IND, W_SPACING, W_PGMAR = w('ind'), w('spacing'), w('pgMar')
+W_RFONTS, W_SZ, W_SZ_CS, W_RSTYLE = w('rFonts'), w('sz'), w('szCs'), w('rStyle')
+W_VAL = w('val')
+
+# Порядок дочерних элементов в схеме WordprocessingML: новый элемент вставляется
+# перед первым из тех, что должны идти после него, иначе Word считает файл поврежденным
+_PPR_AFTER_SPACING = tuple(w(tag) for tag in (
+    'ind', 'contextualSpacing', 'mirrorIndents', 'suppressOverlap', 'jc', 'textDirection', 'textAlignment',
+    'textboxTightWrap', 'outlineLvl', 'divId', 'cnfStyle', 'rPr', 'sectPr', 'pPrChange'))
+_PPR_AFTER_IND = _PPR_AFTER_SPACING[1:]
+_RPR_AFTER_SZ = tuple(w(tag) for tag in (
+    'szCs', 'highlight', 'u', 'effect', 'bdr', 'shd', 'fitText', 'vertAlign', 'rtl', 'cs', 'em', 'lang',
+    'eastAsianLayout', 'specVanish', 'oMath', 'rPrChange'))
+_RPR_AFTER_SZ_CS = _RPR_AFTER_SZ[1:]
+_SECTPR_AFTER_PGMAR = tuple(w(tag) for tag in (
+    'paperSrc', 'pgBorders', 'lnNumType', 'pgNumType', 'cols', 'formProt', 'vAlign', 'noEndnote', 'titlePg',
+    'textDirection', 'bidi', 'rtlGutter', 'docGrid', 'printerSettings', 'sectPrChange'))
+
+_FONT_ATTRS = tuple(w(name) for name in ('ascii', 'hAnsi', 'cs'))
+# Тема перекрывает явное имя шрифта, поэтому при исправлении снимается
+_FONT_THEME_ATTRS = tuple(w(name) for name in ('asciiTheme', 'hAnsiTheme', 'cstheme'))
+_IND_DROP_ATTRS = tuple(w(name) for name in ('hanging', 'hangingChars', 'firstLineChars'))
+_MARGIN_ATTRS = {'top_margin': w('top'), 'bottom_margin': w('bottom'),
+                 'left_margin': w('left'), 'right_margin': w('right')}
+# Обязательные атрибуты w:pgMar, если его приходится создавать (значения Word по умолчанию)
+_PGMAR_DEFAULTS = ((w('header'), '708'), (w('footer'), '708'), (w('gutter'), '0'))
+
+
+def _twips(emu):
+    return str(int(round(emu / 635)))
+
+
+def _child(parent, tag, successors=(), index=None):
+    """Дочерний элемент tag; если его нет — создается на месте, которое требует схема."""
+    child = parent.find(tag)
+    if child is not None:
+        return child
+    child = etree.Element(tag)
+    if index is not None:
+        parent.insert(index, child)
+        return child
+    for i, existing in enumerate(parent):
+        if existing.tag in successors:
+            parent.insert(i, child)
+            return child
+    parent.append(child)
+    return child
+
+
+class DocumentFixer:
+    """Исправления по основному профилю RuleSet; 'fixes' — сколько исправлено по каждому правилу."""
+
+    def __init__(self, resolver, rules=None):
+        self.resolver = resolver
+        self.profile = (rules or rule_set()).primary
+        profile = self.profile
+        self._size = str(int(round(profile.size_pt * 2)))
+        self._indent = _twips(profile.indent_emu)
+        multiple = profile.line_spacing_multiple
+        # Правило без множителя (EXACTLY, AT_LEAST) требует значения, которого в профиле нет
+        self._line = str(int(round(240 * multiple))) if multiple is not None else None
+        self.fixes = dict.fromkeys((RULE_FONT, RULE_PARAGRAPH, RULE_MARGINS), 0)
+
+    def fix_paragraph(self, p, container):
+        text, para_format, run_fonts = paragraph_records(p, self.resolver)
+        if not text.strip():
+            return False
+        changed = False
+        profile = self.profile
+        if container in profile.font_in:
+            runs = (child for child in p if child.tag == W_R)
+            for r, (_, font_name, font_size) in zip(runs, run_fonts):
+                if not profile.font_ok(font_name, font_size):
+                    self._fix_run(r, font_name, font_size)
+                    self.fixes[RULE_FONT] += 1
+                    changed = True
+        if container in profile.paragraph_format_in:
+            indent_ok = profile.indent_ok(para_format.first_line_indent)
+            spacing_ok = (self._line is None or
+                          profile.spacing_ok(para_format.line_spacing_rule, para_format.line_spacing))
+            if not (indent_ok and spacing_ok):
+                pPr = _child(p, W_PPR, index=0)
+                if not spacing_ok:
+                    spacing = _child(pPr, W_SPACING, _PPR_AFTER_SPACING)
+                    spacing.set(w('line'), self._line)
+                    spacing.set(w('lineRule'), 'auto')
+                if not indent_ok:
+                    ind = _child(pPr, W_IND, _PPR_AFTER_IND)
+                    for attr in _IND_DROP_ATTRS:
+                        ind.attrib.pop(attr, None)
+                    ind.set(w('firstLine'), self._indent)
+                self.fixes[RULE_PARAGRAPH] += 1
+                changed = True
+        return changed
+
+    def _fix_run(self, r, font_name, font_size):
+        profile = self.profile
+        rPr = _child(r, W_RPR, index=0)
+        if font_name != profile.font:
+            rStyle = rPr.find(W_RSTYLE)
+            rFonts = _child(rPr, W_RFONTS, index=0 if rStyle is None else rPr.index(rStyle) + 1)
+            for attr in _FONT_THEME_ATTRS:
+                rFonts.attrib.pop(attr, None)
+            for attr in _FONT_ATTRS:
+                rFonts.set(attr, profile.font)
+        if font_size is None or abs(font_size - profile.size_pt) > profile.size_tolerance_pt:
+            _child(rPr, W_SZ, _RPR_AFTER_SZ).set(W_VAL, self._size)
+            _child(rPr, W_SZ_CS, _RPR_AFTER_SZ_CS).set(W_VAL, self._size)
+
+    def fix_section(self, sectPr):
+        profile = self.profile
+        record = section_record(sectPr)
+        wrong = [(attr, target_emu) for attr, _, target_emu, _ in profile.margins
+                 if not profile.margin_ok(getattr(record, attr), target_emu)]
+        if not wrong:
+            return False
+        pgMar = sectPr.find(W_PGMAR)
+        if pgMar is None:
+            # Без w:pgMar не задано ни одно поле, поэтому все четыре попадут в wrong
+            pgMar = _child(sectPr, W_PGMAR, _SECTPR_AFTER_PGMAR)
+            for attr, value in _PGMAR_DEFAULTS:
+                pgMar.set(attr, value)
+        for attr, target_emu in wrong:
+            pgMar.set(_MARGIN_ATTRS[attr], _twips(target_emu))
+        self.fixes[RULE_MARGINS] += 1
+        return True
+
+    def fix_body_element(self, walker, elem):
+        """Исправляет элемент верхнего уровня w:body со всеми вложенными абзацами и секциями.
+
+        Секции берутся из событий обхода, поэтому исправляются те же w:sectPr, что
+        проверяются, в том числе в абзацах внутри w:sdt.
+        """
+        for event in walker.visit(elem):
+            if event[0] == 'paragraph':
+                self.fix_paragraph(event[2], container_of(event[3]))
+            else:
+                self.fix_section(event[3])
+
+    def fix_part(self, root, part):
+        """Исправляет колонтитул целиком; True — что-то изменилось."""
+        changed = False
+        for event in BodyWalker(lambda r_id: None).walk_part(root, part):
+            if event[0] == 'paragraph':
+                changed = self.fix_paragraph(event[2], part) or changed
+        return changed
+
+
+class _BodyWriter:
+    """Пишет document.xml по частям без повторных объявлений пространств имен корня.
+
+    etree.tostring(элемент) повторяет в его открывающем теге все объявления,
+    унаследованные от w:document, — на каждом абзаце это десятки атрибутов.
+    Корень уже записан с ними, поэтому в остальных тегах они убираются.
+    """
+
+    def __init__(self, target, root):
+        self._target = target
+        # Сжатие в архиве дешевле крупными кусками, чем по абзацу
+        self._chunks = []
+        self._size = 0
+        self._declarations = [(f' xmlns:{prefix}="{uri}"' if prefix else f' xmlns="{uri}"').encode('utf-8')
+                              for prefix, uri in root.nsmap.items()]
+
+    def _strip(self, head):
+        for declaration in self._declarations:
+            head = head.replace(declaration, b'')
+        return head
+
+    def write_raw(self, data):
+        self._chunks.append(data)
+        self._size += len(data)
+        if self._size >= _WRITE_CHUNK:
+            self.flush()
+
+    def flush(self):
+        self._target.write(b''.join(self._chunks))
+        self._chunks = []
+        self._size = 0
+
+    def write(self, elem):
+        data = etree.tostring(elem, encoding='UTF-8', xml_declaration=False)
+        # Атрибуты lxml экранирует, поэтому первый '>' закрывает открывающий тег
+        end = data.index(b'>')
+        self.write_raw(self._strip(data[:end]))
+        self.write_raw(data[end:])
+
+    def tags(self, elem, declarations=False):
+        """Открывающий и закрывающий теги elem без содержимого; declarations — оставить объявления (корень)."""
+        data = etree.tostring(etree.Element(elem.tag, dict(elem.attrib), nsmap=elem.nsmap))
+        name = _TAG_NAME.match(data).group(1)
+        start = data[:-2] + b'>'
+        return (start if declarations else self._strip(start)), b'</' + name + b'>'
+
+
+_TAG_NAME = re.compile(rb'<([^\s/>]+)')
+_WRITE_CHUNK = 1 << 20
+
+
+def _transform_body(source, target, fixer):
+    """Потоковое переписывание document.xml: элементы тела исправляются и пишутся по одному."""
+    walker = BodyWalker(lambda r_id: None)
+    target.write(b"<?xml version='1.0' encoding='UTF-8' standalone='yes'?>\n")
+    body = writer = None
+    context = etree.iterparse(source, events=('end',), tag=(W_P, W_TBL, W_SDT, W_SECTPR),
+                              resolve_entities=False, huge_tree=True)
+    for _, elem in context:
+        parent = elem.getparent()
+        if parent.tag != W_BODY:
+            continue
+        if body is None:
+            body = parent
+            root = body.getparent()
+            writer = _BodyWriter(target, root)
+            root_open, root_close = writer.tags(root, declarations=True)
+            writer.write_raw(root_open)
+            # Части документа до w:body (например, w:background)
+            while root[0] is not body:
+                writer.write(root[0])
+                del root[0]
+            body_open, body_close = writer.tags(body)
+            writer.write_raw(body_open)
+        # Все готовые элементы тела до текущего включительно: закладки и прочие
+        # непроверяемые элементы верхнего уровня тоже должны попасть в копию
+        while True:
+            child = body[0]
+            fixer.fix_body_element(walker, child)
+            writer.write(child)
+            del body[0]
+            if child is elem:
+                break
+    root = context.root
+    if body is None:
+        # В теле нет ни абзацев, ни таблиц, ни секций — исправлять нечего
+        target.write(etree.tostring(root, encoding='UTF-8'))
+        return
+    for child in body:
+        fixer.fix_body_element(walker, child)
+        writer.write(child)
+    writer.write_raw(body_close)
+    for child in root[root.index(body) + 1:]:
+        writer.write(child)
+    writer.write_raw(root_close)
+    writer.flush()
+
+
+def fix_document(src_path, dst_path, rules=None):
+    """Пишет исправленную копию src_path в dst_path. Возвращает {'fixes': {правило: число}, 'parts': [...]}.
+
+    dst_path не может совпадать с src_path: исходный файл никогда не перезаписывается.
+    """
+    if os.path.exists(dst_path) and os.path.samefile(src_path, dst_path):
+        raise ValueError("Исправленная копия не может заменять исходный файл")
+    with StreamingDocument(src_path) as doc:
+        fixer = DocumentFixer(doc.resolver, rules)
+        src = doc.zip_file
+        # Колонтитулы маленькие: разбираем и исправляем их заранее, чтобы сохранить порядок частей в архиве
+        rewritten = {}
+        for rel_type, part_name in doc.document_rels.values():
+            if rel_type not in (RT_HEADER, RT_FOOTER) or part_name in rewritten:
+                continue
+            try:
+                root = etree.fromstring(src.read(part_name))
+            except KeyError:
+                continue
+            if fixer.fix_part(root, PART_HEADER if rel_type == RT_HEADER else PART_FOOTER):
+                rewritten[part_name] = etree.tostring(root, xml_declaration=True, encoding='UTF-8',
+                                                      standalone=True)
+
+        dst_dir = os.path.dirname(os.path.abspath(dst_path))
+        os.makedirs(dst_dir, exist_ok=True)
+        # '~$' — как у временных файлов Word: если исполнитель упадет, остаток не примут за документ
+        fd, tmp_path = tempfile.mkstemp(prefix='~$', suffix='.docx', dir=dst_dir)
+        os.close(fd)
+        try:
+            with zipfile.ZipFile(tmp_path, 'w') as dst:
+                for info in src.infolist():
+                    if info.filename == doc.document_part:
+                        with src.open(info) as source, dst.open(_copy_info(info), 'w') as target:
+                            _transform_body(source, target, fixer)
+                    elif info.filename in rewritten:
+                        dst.writestr(_copy_info(info), rewritten[info.filename])
+                    else:
+                        with src.open(info) as source, dst.open(_copy_info(info), 'w') as target:
+                            shutil.copyfileobj(source, target, 1 << 20)
+            os.replace(tmp_path, dst_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    return {'fixes': fixer.fixes, 'parts': sorted(rewritten)}
+
+
+def _copy_info(info):
+    """ZipInfo для копии части: то же имя, время и сжатие."""
+    copy = zipfile.ZipInfo(info.filename, info.date_time)
+    copy.compress_type = info.compress_type
+    copy.external_attr = info.external_attr
+    return copy
+
+
+def fixed_path(path, out_dir=None, base=None):
+    """Куда писать копию: рядом с исходным (name.fixed.docx) или в out_dir с той же структурой каталогов."""
+    if out_dir is None:
+        return path[:-len('.docx')] + FIXED_SUFFIX if path.lower().endswith('.docx') else path + FIXED_SUFFIX
+    relative = os.path.relpath(path, base) if base else os.path.basename(path)
+    return os.path.join(out_dir, relative)
+
+
+def error_result(path, dst_path, error, elapsed=0.0):
+    """Результат fix_file для файла, который не удалось исправить."""
+    return {'path': path, 'output': dst_path, 'status': 'error', 'fixes': {}, 'error': error, 'elapsed': elapsed}
+
+
+def fix_file(path, dst_path, profiles=None, profiles_path=None):
+    """Исправляет один файл в процессе-исполнителе. Никогда не бросает исключений."""
+    started = time.perf_counter()
+    try:
+        result = fix_document(path, dst_path, rule_set(profiles, profiles_path))
+    except Exception as e:
+        return error_result(path, dst_path, f"{type(e).__name__}: {e}", time.perf_counter() - started)
+    return {'path': path, 'output': dst_path, 'status': 'fixed' if any(result['fixes'].values()) else 'clean',
+            'fixes': result['fixes'], 'error': None, 'elapsed': time.perf_counter() - started}
+
+
+def fix_details(result):
+    fixes = result['fixes']
+    return (f"шрифт: {fixes[RULE_FONT]}, абзацы: {fixes[RULE_PARAGRAPH]}, "
+            f"поля: {fixes[RULE_MARGINS]} -> {result['output']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Исправленные копии .docx по профилю требований ОС ТУСУР")
+    parser.add_argument('inputs', nargs='+', help="файлы, каталоги или glob-шаблоны")
+    parser.add_argument('--out-dir', metavar='DIR',
+                        help=f"каталог для копий (по умолчанию рядом с исходным, имя *{FIXED_SUFFIX})")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help="число процессов (по умолчанию — все ядра)")
+    parser.add_argument('--no-recursive', action='store_true', help="не заходить в подкаталоги")
+    parser.add_argument('--profile', dest='profile', metavar='NAME', help="профиль требований")
+    parser.add_argument('--profiles-file', metavar='PATH', help="файл профилей (по умолчанию profiles.json)")
+    args = parser.parse_args(argv)
+
+    profiles = [args.profile] if args.profile else None
+    try:
+        rule_set(profiles, args.profiles_file)
+    except (OSError, ValueError) as e:
+        print(f"Ошибка в профилях требований: {e}", file=sys.stderr)
+        return 2
+    # Уже исправленные копии при повторном запуске не исправляем еще раз
+    files = [p for p in collect_files(args.inputs, recursive=not args.no_recursive)
+             if not p.endswith(FIXED_SUFFIX)]
+    if not files:
+        print("Не найдено ни одного .docx файла.", file=sys.stderr)
+        return 2
+    base = None
+    if args.out_dir is not None:
+        base = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in files])
+    targets = {path: fixed_path(os.path.abspath(path) if base else path, args.out_dir, base) for path in files}
+
+    started = time.perf_counter()
+    try:
+        results = run_pool(fix_file, [(path, targets[path], profiles, args.profiles_file) for path in files],
+                           args.jobs, describe=fix_details, labels=STATUS_LABELS,
+                           on_error=lambda path, error: error_result(path, targets[path], error))
+    except KeyboardInterrupt:
+        print("Исправление прервано.", file=sys.stderr)
+        return 130
+    wall_time = time.perf_counter() - started
+    fixed = sum(1 for r in results if r['status'] == 'fixed')
+    errors = sum(1 for r in results if r['status'] == 'error')
+    print("--- ИТОГ ---")
+    print(f"Файлов: {len(results)}; исправлено: {fixed}; без изменений: {len(results) - fixed - errors}; "
+          f"ошибок: {errors}")
+    print(f"Время: {wall_time:.2f} с")
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
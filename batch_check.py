@@ -0,0 +1,409 @@
+"""Пакетная проверка .docx без GUI.
+
+Примеры:
+    python batch_check.py ./theses
+    python batch_check.py "./2024/**/*.docx" -j 8
+    python batch_check.py ./theses --profile tusur --profile tusur-12pt
+    python batch_check.py ./theses --format ndjson -o findings.ndjson
+    python batch_check.py ./theses --instrument timings.json --instrument-memory
+"""
+import argparse
+import collections
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import checker_core
+import stream_engine
+from checker_core import count_issues
+from findings import WRITERS, margin_findings, paragraph_findings, summary_record
+from instrumentation import NULL, Instrumentation
+from result_cache import CACHE_ERRORS, DEFAULT_CACHE_DIR, ResultCache
+from rule_profiles import load_profiles, rule_set
+
+# Движки разбора: 'stream' — потоковый (по умолчанию), 'docx' — через объектную модель python-docx
+ENGINES = {
+    'stream': stream_engine.analyze_document,
+    'docx': checker_core.analyze_document,
+}
+
+# Статусы результатов check_file в журнале
+STATUS_LABELS = {'pass': 'OK', 'fail': 'FAIL', 'error': 'ERROR'}
+
+# Ошибка файла, который проверялся, когда процесс-исполнитель аварийно завершился
+WORKER_CRASHED = "BrokenProcessPool: процесс-исполнитель аварийно завершился во время проверки"
+
+
+def collect_files(inputs, recursive=True):
+    """Раскрывает каталоги и glob-шаблоны в отсортированный список .docx без повторов."""
+    found = []
+    for item in inputs:
+        if os.path.isdir(item):
+            pattern = os.path.join(item, '**', '*.docx') if recursive else os.path.join(item, '*.docx')
+            found.extend(glob.glob(pattern, recursive=recursive))
+        elif glob.has_magic(item):
+            found.extend(p for p in glob.glob(item, recursive=True) if os.path.isfile(p))
+        else:
+            found.append(item)
+    # Временные файлы Word (~$name.docx) не являются документами
+    files = [p for p in found if not os.path.basename(p).startswith('~$')]
+    return sorted(set(files))
+
+
+# Кэш результатов открывается один раз на процесс-исполнитель
+_worker_cache = None
+# Очередь записей замечаний от исполнителей к основному процессу (см. run_batch)
+_findings_queue = None
+# Записи уходят в очередь пачками: память исполнителя ограничена, а передач немного
+FINDINGS_BATCH = 256
+
+
+def _init_worker(findings_queue):
+    global _findings_queue
+    _findings_queue = findings_queue
+
+
+def _get_worker_cache(cache_dir):
+    global _worker_cache
+    if _worker_cache is None:
+        _worker_cache = ResultCache(cache_dir)
+    return _worker_cache
+
+
+def check_file(path, engine='stream', cache_dir=None, profiles=None, profiles_path=None, findings=False,
+               instrument=None):
+    """Проверяет один файл в процессе-исполнителе. Никогда не бросает исключений.
+
+    cache_dir включает кэш результатов (только для движка stream); profiles —
+    имена профилей требований (первый — основной), profiles_path — файл профилей.
+    findings=True отправляет записи замечаний (findings.py) в очередь run_batch по мере
+    проверки абзацев (пачками по FINDINGS_BATCH), а в конце — итоговую запись файла;
+    отчеты по абзацам при этом не накапливаются ни в исполнителе, ни в результате.
+    instrument — параметры instrumentation.Instrumentation ({'memory': ..., 'profile': ...}):
+    в результат добавляется 'instrumentation' с замерами по этапам.
+    """
+    started = time.perf_counter()
+    instr = Instrumentation(**instrument) if instrument is not None else NULL
+    batch = [] if findings else None
+    on_paragraph = None
+    if findings:
+        def on_paragraph(para_report):
+            with instr.phase('output'):
+                batch.extend(paragraph_findings(path, para_report))
+                if len(batch) >= FINDINGS_BATCH:
+                    _findings_queue.put(batch.copy())
+                    batch.clear()
+    try:
+        rules = rule_set(profiles, profiles_path)
+        with instr:
+            if cache_dir is not None and engine == 'stream':
+                report = stream_engine.analyze_document(path, cache=_get_worker_cache(cache_dir), rules=rules,
+                                                        on_paragraph=on_paragraph, instrumentation=instr)
+            else:
+                report = ENGINES[engine](path, rules=rules, on_paragraph=on_paragraph, instrumentation=instr)
+            if findings:
+                # Поля известны только после обхода всех секций, поэтому идут после абзацев
+                with instr.phase('output'):
+                    batch.extend(margin_findings(path, report['section_margin_errors']))
+                    _findings_queue.put(batch.copy())
+                    batch.clear()
+    except Exception as e:
+        result = error_result(path, f"{type(e).__name__}: {e}", time.perf_counter() - started, instr.report())
+    else:
+        issues = count_issues(report)
+        result = {
+            'path': path,
+            'status': 'fail' if issues else 'pass',
+            'issues': issues,
+            'paragraph_count': report['paragraph_count'],
+            'section_count': report['section_count'],
+            'error': None,
+            'profile': report['profile'],
+            'profiles': report['profiles'],
+            'instrumentation': instr.report(),
+            'elapsed': time.perf_counter() - started,
+        }
+    if findings:
+        # Итоговая запись содержит сами замеры, поэтому в этап output не входит
+        batch.append(summary_record(result))
+        _findings_queue.put(batch)
+    return result
+
+
+def error_result(path, error, elapsed=0.0, instrumentation=None):
+    """Результат check_file для файла, который не удалось проверить."""
+    return {'path': path, 'status': 'error', 'issues': 0, 'paragraph_count': 0, 'error': error, 'profiles': {},
+            'instrumentation': instrumentation, 'elapsed': elapsed}
+
+
+def check_details(result):
+    details = f"замечаний: {result['issues']}, абзацев: {result['paragraph_count']}"
+    if len(result['profiles']) > 1:
+        details += '; ' + ', '.join(f"{name}: {'OK' if issues == 0 else issues}"
+                                    for name, issues in result['profiles'].items())
+    return details
+
+
+def format_result_line(result, describe=check_details, labels=STATUS_LABELS):
+    """Строка журнала на файл: статус, путь, describe(result) (для ошибки — ее текст) и время."""
+    details = result['error'] if result['status'] == 'error' else describe(result)
+    return f"{labels[result['status']]:<6}{result['path']} ({details}; {result['elapsed']:.2f} с)"
+
+
+def run_pool(task, task_args, jobs=None, out=sys.stdout, describe=check_details, labels=STATUS_LABELS,
+             on_error=error_result, initializer=None, initargs=()):
+    """Выполняет task(*args) в пуле процессов для каждого args из task_args (args[0] — путь
+    к файлу), печатает строку на файл и возвращает список результатов в порядке готовности.
+
+    task не бросает исключений и возвращает словарь с 'path', 'status', 'error' и 'elapsed'.
+    Если упал сам процесс-исполнитель (нехватка памяти, сбой в библиотеке), результатом
+    файлов, которые проверялись в этот момент, становится on_error(путь, текст ошибки);
+    остальные файлы проверяются в новом пуле. В работе одновременно не больше jobs файлов,
+    поэтому «в работе» — это действительно файлы, занятые исполнителями.
+    При Ctrl+C очередь отменяется, исполнители завершаются, KeyboardInterrupt идет дальше.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    queued = collections.deque(task_args)
+    running = {}
+    results = []
+    executor = None
+    try:
+        while queued or running:
+            if executor is None:
+                executor = ProcessPoolExecutor(max_workers=jobs, initializer=initializer, initargs=initargs)
+                broken = False
+            while queued and len(running) < jobs and not broken:
+                args = queued.popleft()
+                try:
+                    running[executor.submit(task, *args)] = args[0]
+                except BrokenProcessPool:
+                    queued.appendleft(args)
+                    broken = True
+            if running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = running.pop(future)
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        result = on_error(path, WORKER_CRASHED)
+                    except Exception as e:
+                        result = on_error(path, f"{type(e).__name__}: {e}")
+                    results.append(result)
+                    print(format_result_line(result, describe, labels), file=out, flush=True)
+            # Сломанный пул принимает задачи только с ошибкой: дожидаемся файлов, которые
+            # в нем были, и продолжаем очередь в новом
+            if broken and not running:
+                executor.shutdown(wait=True)
+                executor = None
+    except KeyboardInterrupt:
+        if executor is not None:
+            terminate_pool(executor)
+            executor = None
+        raise
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+    return results
+
+
+def terminate_pool(executor):
+    """Отменяет задачи пула, не дожидаясь очереди, и завершает его процессы."""
+    processes = list((executor._processes or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join()
+
+
+def _write_records(findings_queue, writer, summarized):
+    """Поток основного процесса: пишет пачки записей от исполнителей до метки None.
+
+    Пути документов, по которым пришла итоговая запись, добавляются в summarized.
+    """
+    while True:
+        records = findings_queue.get()
+        if records is None:
+            return
+        for record in records:
+            writer.write(record)
+            if record['record'] == 'summary':
+                summarized.add(record['document'])
+
+
+def run_batch(files, jobs=None, engine='stream', cache_dir=None, profiles=None, profiles_path=None,
+              out=sys.stdout, writer=None, instrument=None):
+    """Проверяет файлы в пуле процессов, печатает строку на файл и возвращает список результатов.
+
+    writer — объект из findings.WRITERS: исполнители передают записи замечаний через
+    очередь по мере проверки абзацев, и они сразу пишутся в writer; итоговая запись
+    файла идет после его замечаний.
+    instrument — см. check_file; замеры остаются в результатах под 'instrumentation'.
+    """
+    if not files:
+        return []
+    if writer is None:
+        task_args = [(path, engine, cache_dir, profiles, profiles_path, False, instrument) for path in files]
+        return run_pool(check_file, task_args, jobs, out)
+    # Очередь менеджера: put в исполнителе завершается до того, как он вернет результат,
+    # поэтому записи файла не теряются, а аварийно завершенный исполнитель не может
+    # оставить очередь заблокированной
+    with multiprocessing.Manager() as manager:
+        findings_queue = manager.Queue()
+        summarized = set()
+        reader = threading.Thread(target=_write_records, args=(findings_queue, writer, summarized), daemon=True)
+        reader.start()
+        try:
+            task_args = [(path, engine, cache_dir, profiles, profiles_path, True, instrument) for path in files]
+            results = run_pool(check_file, task_args, jobs, out, initializer=_init_worker,
+                               initargs=(findings_queue,))
+        finally:
+            findings_queue.put(None)
+            reader.join()
+    for result in results:
+        if result['status'] == 'error' and result['path'] not in summarized:
+            writer.write(summary_record(result))
+    return results
+
+
+def instrumentation_report(results):
+    """JSON-отчет замеров: по каждому файлу (самые медленные первыми) и сумма по пакету."""
+    total = Instrumentation()
+    files = []
+    for result in results:
+        report = result.get('instrumentation')
+        if report is None:
+            continue
+        total.merge(report)
+        files.append(dict(report, path=result['path'], status=result['status'],
+                          paragraph_count=result['paragraph_count']))
+    files.sort(key=lambda report: report['total_seconds'], reverse=True)
+    return {'total': total.report(), 'files': files}
+
+
+def print_summary(results, wall_time, out=sys.stdout):
+    passed = sum(1 for r in results if r['status'] == 'pass')
+    failed = sum(1 for r in results if r['status'] == 'fail')
+    errors = sum(1 for r in results if r['status'] == 'error')
+    paragraphs = sum(r['paragraph_count'] for r in results)
+    files_per_sec = len(results) / wall_time if wall_time > 0 else 0.0
+    paras_per_sec = paragraphs / wall_time if wall_time > 0 else 0.0
+    print("--- ИТОГ ---", file=out)
+    print(f"Файлов: {len(results)}; без замечаний: {passed}; с замечаниями: {failed}; ошибок: {errors}", file=out)
+    profile_names = next((list(r['profiles']) for r in results if r['profiles']), [])
+    if len(profile_names) > 1:
+        for name in profile_names:
+            ok = sum(1 for r in results if r['profiles'].get(name) == 0)
+            print(f"Профиль {name}: соответствуют {ok} из {len(results)}", file=out)
+    print(f"Время: {wall_time:.2f} с; {files_per_sec:.1f} файлов/с; {paras_per_sec:.0f} абзацев/с", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетная проверка оформления .docx по ОС ТУСУР")
+    parser.add_argument('inputs', nargs='*', help="файлы, каталоги или glob-шаблоны")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help="число процессов (по умолчанию — все ядра)")
+    parser.add_argument('--no-recursive', action='store_true', help="не заходить в подкаталоги")
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='stream',
+                        help="движок разбора документа (по умолчанию stream)")
+    parser.add_argument('--cache', action='store_true', help="кэшировать результаты (только движок stream)")
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help=f"каталог кэша, включает --cache (по умолчанию {DEFAULT_CACHE_DIR})")
+    parser.add_argument('--profile', action='append', dest='profiles', metavar='NAME',
+                        help="профиль требований; можно указать несколько, первый — основной")
+    parser.add_argument('--profiles-file', metavar='PATH', help="файл профилей (по умолчанию profiles.json)")
+    parser.add_argument('--list-profiles', action='store_true', help="показать профили и выйти")
+    parser.add_argument('--format', choices=('text',) + tuple(WRITERS), default='text',
+                        help="text — строка на файл; ndjson/json/html — запись на каждое замечание "
+                             "и итог по файлу (см. findings.py)")
+    parser.add_argument('-o', '--output', metavar='PATH',
+                        help="файл для отчета в формате --format (по умолчанию stdout)")
+    parser.add_argument('--instrument', metavar='PATH',
+                        help="записать в PATH JSON с замерами по этапам и счетчиками для каждого файла")
+    parser.add_argument('--instrument-memory', action='store_true',
+                        help="с --instrument: пиковая память по этапам (tracemalloc, заметно медленнее)")
+    parser.add_argument('--instrument-profile', action='store_true',
+                        help="с --instrument: самые затратные функции (cProfile)")
+    args = parser.parse_args(argv)
+
+    # Ошибки в файле профилей и опечатки в именах показываем до запуска пула
+    try:
+        profiles, default = load_profiles(args.profiles_file)
+        rule_set(args.profiles, args.profiles_file)
+    except (OSError, ValueError) as e:
+        print(f"Ошибка в профилях требований: {e}", file=sys.stderr)
+        return 2
+    if args.list_profiles:
+        for name, profile in profiles.items():
+            print(f"{name}{' (по умолчанию)' if name == default else ''}: {profile.title}")
+        return 0
+    if not args.inputs:
+        parser.error("не указаны файлы для проверки")
+
+    cache_dir = None
+    if args.cache or args.cache_dir:
+        if args.engine != 'stream':
+            parser.error("--cache поддерживается только движком stream")
+        cache_dir = args.cache_dir or DEFAULT_CACHE_DIR
+        # Недоступный каталог кэша — одна ошибка до запуска пула, а не ERROR на каждый файл
+        try:
+            ResultCache(cache_dir).close()
+        except CACHE_ERRORS as e:
+            print(f"Кэш результатов недоступен: {e}", file=sys.stderr)
+            return 2
+
+    files = collect_files(args.inputs, recursive=not args.no_recursive)
+    if not files:
+        print("Не найдено ни одного .docx файла.", file=sys.stderr)
+        return 2
+
+    instrument = None
+    if args.instrument:
+        instrument = {'memory': args.instrument_memory, 'profile': args.instrument_profile}
+    elif args.instrument_memory or args.instrument_profile:
+        parser.error("--instrument-memory и --instrument-profile требуют --instrument PATH")
+    writer = None
+    report_out = None
+    # Строки по файлам и итог не смешиваются с машиночитаемым отчетом в stdout
+    log = sys.stdout
+    if args.format != 'text':
+        if args.output:
+            report_out = open(args.output, 'w', encoding='utf-8')
+        else:
+            log = sys.stderr
+        writer = WRITERS[args.format](report_out or sys.stdout, flush_each=report_out is None)
+    started = time.perf_counter()
+    try:
+        results = run_batch(files, jobs=args.jobs, engine=args.engine, cache_dir=cache_dir,
+                            profiles=args.profiles, profiles_path=args.profiles_file, out=log, writer=writer,
+                            instrument=instrument)
+    except KeyboardInterrupt:
+        print("Проверка прервана.", file=sys.stderr)
+        return 130
+    except Exception:
+        traceback.print_exc()
+        return 2
+    finally:
+        if writer is not None:
+            writer.close()
+        if report_out is not None:
+            report_out.close()
+    print_summary(results, time.perf_counter() - started, out=log)
+    if instrument is not None:
+        with open(args.instrument, 'w', encoding='utf-8') as f:
+            json.dump(instrumentation_report(results), f, ensure_ascii=False, indent=1)
+    return 0 if all(r['status'] == 'pass' for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
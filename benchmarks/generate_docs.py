@@ -0,0 +1,206 @@
+"""Генератор синтетических .docx для замеров производительности.
+
+XML пишется напрямую в архив потоком, без python-docx, поэтому документ на
+100 тыс. абзацев собирается за секунды. Пример:
+    python -m benchmarks.generate_docs /tmp/bench.docx --paragraphs 20000 --runs-per-paragraph 12
+"""
+import argparse
+import random
+import zipfile
+from xml.sax.saxutils import escape
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+HEADER_CT = 'application/vnd.openxmlformats-officedocument.wordprocessingml.header+xml'
+FOOTER_CT = 'application/vnd.openxmlformats-officedocument.wordprocessingml.footer+xml'
+RT_PREFIX = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+
+CONTENT_TYPES = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+<Override PartName="/word/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>
+<Override PartName="/word/theme/theme1.xml" ContentType="application/vnd.openxmlformats-officedocument.theme+xml"/>
+{overrides}</Types>'''
+
+PACKAGE_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>
+</Relationships>'''
+
+DOCUMENT_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/theme" Target="theme/theme1.xml"/>
+{relationships}</Relationships>'''
+
+THEME = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<a:theme xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" name="Bench"><a:themeElements>
+<a:fontScheme name="Bench"><a:majorFont><a:latin typeface="Calibri Light"/></a:majorFont>
+<a:minorFont><a:latin typeface="Calibri"/></a:minorFont></a:fontScheme>
+</a:themeElements></a:theme>'''
+
+WORDS = ('анализ', 'система', 'данные', 'модель', 'результат', 'метод', 'работа', 'процесс',
+         'Томского', 'университета', 'радиоэлектроники', 'выполнения', 'получение', 'навыков')
+
+GOOD_PPR = '<w:pPr><w:pStyle w:val="{style}"/><w:spacing w:line="360" w:lineRule="auto"/><w:ind w:firstLine="709"/></w:pPr>'
+# Отступ 0.9 см и одинарный интервал — нарушения параметров абзаца
+BAD_INDENT_PPR = '<w:pPr><w:pStyle w:val="{style}"/><w:spacing w:line="360" w:lineRule="auto"/><w:ind w:firstLine="510"/></w:pPr>'
+BAD_SPACING_PPR = '<w:pPr><w:pStyle w:val="{style}"/><w:spacing w:line="240" w:lineRule="auto"/><w:ind w:firstLine="709"/></w:pPr>'
+BAD_RUN_PROPS = ('<w:rPr><w:rFonts w:ascii="Arial" w:hAnsi="Arial"/></w:rPr>',
+                 '<w:rPr><w:sz w:val="26"/></w:rPr>',
+                 '<w:rPr><w:rStyle w:val="Small"/></w:rPr>')
+# Форматирование, не меняющее эффективный шрифт: фрагменты не склеиваются в XML,
+# но склеиваются в один логический фрагмент (как после правок в Word)
+NEUTRAL_RUN_PROPS = ('', '<w:rPr><w:lang w:val="ru-RU"/></w:rPr>', '<w:rPr><w:sz w:val="28"/></w:rPr>')
+
+GOOD_PGMAR = '<w:pgMar w:top="1134" w:right="850" w:bottom="1134" w:left="1701" w:header="708" w:footer="708" w:gutter="0"/>'
+# Узкие поля альбомного приложения — нарушение полей раздела
+BAD_PGMAR = '<w:pgMar w:top="567" w:right="567" w:bottom="567" w:left="567" w:header="708" w:footer="708" w:gutter="0"/>'
+
+
+def styles_xml(style_depth):
+    """Цепочка Body1 <- Body2 <- ... <- BodyN; шрифт задан в начале цепочки, размер — в конце."""
+    styles = ['<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/></w:style>',
+              '<w:style w:type="character" w:default="1" w:styleId="DefaultParagraphFont">'
+              '<w:name w:val="Default Paragraph Font"/></w:style>',
+              '<w:style w:type="character" w:styleId="Small"><w:name w:val="Small"/>'
+              '<w:rPr><w:sz w:val="24"/></w:rPr></w:style>']
+    for level in range(1, style_depth + 1):
+        based_on = 'Normal' if level == 1 else f'Body{level - 1}'
+        rpr = ''
+        if level == 1:
+            rpr = '<w:rPr><w:rFonts w:ascii="Times New Roman" w:hAnsi="Times New Roman"/></w:rPr>'
+        if level == style_depth:
+            rpr = rpr or '<w:rPr></w:rPr>'
+            rpr = rpr.replace('</w:rPr>', '<w:sz w:val="28"/></w:rPr>')
+        styles.append(f'<w:style w:type="paragraph" w:styleId="Body{level}"><w:name w:val="Body {level}"/>'
+                      f'<w:basedOn w:val="{based_on}"/>{rpr}</w:style>')
+    return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<w:styles xmlns:w="{W_NS}">'
+            '<w:docDefaults><w:rPrDefault><w:rPr><w:rFonts w:asciiTheme="minorHAnsi" w:hAnsiTheme="minorHAnsi"/>'
+            '<w:sz w:val="22"/></w:rPr></w:rPrDefault></w:docDefaults>' + ''.join(styles) + '</w:styles>')
+
+
+def _paragraph_xml(rng, style, runs_per_paragraph, violation_rate):
+    roll = rng.random()
+    if roll < violation_rate / 3:
+        ppr = BAD_INDENT_PPR
+    elif roll < violation_rate * 2 / 3:
+        ppr = BAD_SPACING_PPR
+    else:
+        ppr = GOOD_PPR
+    parts = ['<w:p>', ppr.format(style=style)]
+    for _ in range(runs_per_paragraph):
+        if rng.random() < violation_rate / 3:
+            rpr = rng.choice(BAD_RUN_PROPS)
+        else:
+            rpr = rng.choice(NEUTRAL_RUN_PROPS)
+        text = escape(rng.choice(WORDS)) + ' '
+        parts.append(f'<w:r>{rpr}<w:t xml:space="preserve">{text}</w:t></w:r>')
+    parts.append('</w:p>')
+    return ''.join(parts)
+
+
+def _table_xml(rng, style, runs_per_paragraph, violation_rate, rows=3, cols=3):
+    parts = ['<w:tbl><w:tblPr><w:tblW w:w="0" w:type="auto"/></w:tblPr><w:tblGrid>']
+    parts.extend('<w:gridCol w:w="3000"/>' for _ in range(cols))
+    parts.append('</w:tblGrid>')
+    for _ in range(rows):
+        parts.append('<w:tr>')
+        for _ in range(cols):
+            parts.append('<w:tc><w:tcPr><w:tcW w:w="3000" w:type="dxa"/></w:tcPr>')
+            parts.append(_paragraph_xml(rng, style, max(1, runs_per_paragraph // 4), violation_rate))
+            parts.append('</w:tc>')
+        parts.append('</w:tr>')
+    parts.append('</w:tbl>')
+    return ''.join(parts)
+
+
+def _sect_pr_xml(section_no, headers):
+    """w:sectPr раздела section_no (с 1): у четных разделов поля нарушены."""
+    refs = ''
+    if headers:
+        refs = (f'<w:headerReference w:type="default" r:id="rIdH{section_no}"/>'
+                f'<w:footerReference w:type="default" r:id="rIdF{section_no}"/>')
+    pg_mar = BAD_PGMAR if section_no % 2 == 0 else GOOD_PGMAR
+    return f'<w:sectPr>{refs}<w:pgSz w:w="11906" w:h="16838"/>{pg_mar}</w:sectPr>'
+
+
+def _section_break_xml(section_no, headers):
+    """Абзац, закрывающий раздел section_no; каждый второй — внутри элемента управления w:sdt."""
+    p = f'<w:p><w:pPr>{_sect_pr_xml(section_no, headers)}</w:pPr></w:p>'
+    return f'<w:sdt><w:sdtContent>{p}</w:sdtContent></w:sdt>' if section_no % 2 == 0 else p
+
+
+def _part_xml(root, rng, style, runs_per_paragraph, violation_rate):
+    return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<w:{root} xmlns:w="{W_NS}">'
+            f'{_paragraph_xml(rng, style, runs_per_paragraph, violation_rate)}</w:{root}>')
+
+
+def generate_document(path, paragraphs=1000, runs_per_paragraph=8, style_depth=4, table_every=0,
+                      violation_rate=0.05, seed=1, sections=1, headers=False):
+    """Пишет .docx: paragraphs абзацев тела по runs_per_paragraph w:r, абзацный стиль
+    с цепочкой basedOn глубины style_depth, таблица 3x3 после каждых table_every
+    абзацев (0 — без таблиц), доля нарушений violation_rate. Абзацы делятся на sections
+    разделов (у четных нарушены поля); headers=True дает каждому разделу верхний и
+    нижний колонтитулы с абзацем из фрагментов."""
+    rng = random.Random(seed)
+    style = f'Body{style_depth}' if style_depth else 'Normal'
+    overrides = relationships = ''
+    if headers:
+        overrides = ''.join(f'<Override PartName="/word/{kind}{n}.xml" ContentType="{content_type}"/>\n'
+                            for n in range(1, sections + 1)
+                            for kind, content_type in (('header', HEADER_CT), ('footer', FOOTER_CT)))
+        relationships = ''.join(f'<Relationship Id="rId{kind[0].upper()}{n}" Type="{RT_PREFIX}{kind}" '
+                                f'Target="{kind}{n}.xml"/>\n'
+                                for n in range(1, sections + 1) for kind in ('header', 'footer'))
+    section_every = -(-paragraphs // sections) if sections > 1 else 0
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', CONTENT_TYPES.format(overrides=overrides))
+        zf.writestr('_rels/.rels', PACKAGE_RELS)
+        zf.writestr('word/_rels/document.xml.rels', DOCUMENT_RELS.format(relationships=relationships))
+        zf.writestr('word/styles.xml', styles_xml(style_depth))
+        zf.writestr('word/theme/theme1.xml', THEME)
+        if headers:
+            for n in range(1, sections + 1):
+                zf.writestr(f'word/header{n}.xml', _part_xml('hdr', rng, style, runs_per_paragraph, violation_rate))
+                zf.writestr(f'word/footer{n}.xml', _part_xml('ftr', rng, style, runs_per_paragraph, violation_rate))
+        with zf.open('word/document.xml', 'w', force_zip64=True) as out:
+            out.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                      f'<w:document xmlns:w="{W_NS}" xmlns:r="{R_NS}"><w:body>'.encode('utf-8'))
+            chunk = []
+            section_no = 1
+            for p_idx in range(paragraphs):
+                chunk.append(_paragraph_xml(rng, style, runs_per_paragraph, violation_rate))
+                if table_every and (p_idx + 1) % table_every == 0:
+                    chunk.append(_table_xml(rng, style, runs_per_paragraph, violation_rate))
+                if section_every and (p_idx + 1) % section_every == 0 and section_no < sections:
+                    chunk.append(_section_break_xml(section_no, headers))
+                    section_no += 1
+                if len(chunk) >= 500:
+                    out.write(''.join(chunk).encode('utf-8'))
+                    chunk = []
+            chunk.append(f'{_sect_pr_xml(section_no, headers)}</w:body></w:document>')
+            out.write(''.join(chunk).encode('utf-8'))
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Генератор синтетических .docx для замеров")
+    parser.add_argument('output')
+    parser.add_argument('--paragraphs', type=int, default=1000)
+    parser.add_argument('--runs-per-paragraph', type=int, default=8)
+    parser.add_argument('--style-depth', type=int, default=4)
+    parser.add_argument('--table-every', type=int, default=0)
+    parser.add_argument('--violation-rate', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--sections', type=int, default=1)
+    parser.add_argument('--headers', action='store_true', help="колонтитулы у каждого раздела")
+    args = parser.parse_args(argv)
+    generate_document(args.output, args.paragraphs, args.runs_per_paragraph, args.style_depth,
+                      args.table_every, args.violation_rate, args.seed, args.sections, args.headers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Сравнение склейки логических фрагментов на сильно фрагментированных абзацах.
+
+Запуск из корня репозитория:
+    python -m benchmarks.run_merging --runs 500 2000 5000
+
+legacy — прежний цикл из analyze_docx: para.runs (и len(para.runs)) на каждой
+итерации, склейка строк через +=, словарь на фрагмент; квадратичен по числу w:r.
+current — проверка обоих движков: traversal.paragraph_records (один проход по w:r) и
+checker_core.build_paragraph_report (merge_logical_runs).
+"""
+import argparse
+import time
+
+from docx import Document
+from docx.shared import Pt
+
+from checker_core import are_effective_fonts_same, build_paragraph_report, check_font_and_size
+from style_resolver import StyleResolver, run_style_id
+from traversal import paragraph_records
+
+
+def make_fragmented_paragraph(run_count, group_len=7):
+    """Абзац из односимвольных w:r; размер шрифта меняется каждые group_len фрагментов."""
+    document = Document()
+    para = document.add_paragraph()
+    for i in range(run_count):
+        run = para.add_run('абвгдеж '[i % 8])
+        run.font.name = 'Times New Roman'
+        run.font.size = Pt(14 if (i // group_len) % 2 else 13)
+    return document, para
+
+
+def legacy_analyze_runs(para, resolver):
+    p_style_id = para._p.style
+
+    def font_of(run):
+        rPr = run._r.rPr
+        return resolver.effective_font(p_style_id, run_style_id(rPr), rPr)
+
+    logical_runs = []
+    fragment_counter = 1
+    buffer_text = ""
+    buffer_name, buffer_size = font_of(para.runs[0])
+    for run_idx, current_run in enumerate(para.runs):
+        name, size = font_of(current_run)
+        is_last = (run_idx == len(para.runs) - 1)
+        if not are_effective_fonts_same(buffer_name, buffer_size, name, size):
+            if buffer_text.strip():
+                errors = check_font_and_size(buffer_text, buffer_name, buffer_size)
+                logical_runs.append({'text': buffer_text, 'has_font_errors': bool(errors),
+                                     'error_details': errors, 'fragment_number': fragment_counter if errors else None})
+                if errors: fragment_counter += 1
+            buffer_text = current_run.text
+            buffer_name, buffer_size = name, size
+        else:
+            buffer_text += current_run.text
+        if is_last and buffer_text.strip():
+            errors = check_font_and_size(buffer_text, buffer_name, buffer_size)
+            logical_runs.append({'text': buffer_text, 'has_font_errors': bool(errors),
+                                 'error_details': errors, 'fragment_number': fragment_counter if errors else None})
+    return logical_runs
+
+
+def current_analyze_runs(p, resolver):
+    text, para_format, run_fonts = paragraph_records(p, resolver)
+    return build_paragraph_report(0, text, para_format, run_fonts)
+
+
+def _best_of(func, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, nargs='+', default=[500, 1000, 2000, 4000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'w:r в абзаце':>12} {'legacy, с':>10} {'current, с':>11} {'ускорение':>10}")
+    for run_count in args.runs:
+        document, para = make_fragmented_paragraph(run_count)
+        resolver = StyleResolver.from_document(document)
+        legacy_time, legacy = _best_of(lambda: legacy_analyze_runs(para, resolver), args.repeat)
+        current_time, report = _best_of(lambda: current_analyze_runs(para._p, resolver), args.repeat)
+        assert [lr['text'] for lr in legacy] == [lr.text for lr in report['logical_runs']]
+        print(f"{run_count:>12} {legacy_time:>10.4f} {current_time:>11.4f} {legacy_time / current_time:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""Набор замеров проверки по этапам на синтетических документах.
+
+Этапы: parse (zip + XML), styles (разрешение стилей и текст фрагментов),
+merge (склейка логических фрагментов), rules (build_paragraph_report: склейка
+и проверки), render (отчет в JSON и HTML-фрагменты для окна, если установлен
+PyQt5). Время этапов меряется таймерами instrumentation.py внутри одного
+прохода; для пикового RSS конвейер до каждого этапа запускается в отдельном
+процессе, и прирост RSS считается от уровня после импортов. Qt-окно и дисплей
+не нужны. Пример:
+    python -m benchmarks.suite --paragraphs 1000 10000 100000 --json bench.json
+    python -m benchmarks.suite --compare bench.json   # код 1 при регрессии
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from benchmarks.generate_docs import generate_document
+
+STAGES = ('parse', 'styles', 'merge', 'rules', 'render')
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает КиБ, macOS — байты
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_pipeline(path, depth=len(STAGES) - 1):
+    """Проход по документу с этапами STAGES[:depth + 1].
+
+    Возвращает ({этап: секунды}, число абзацев, прирост пикового RSS в МиБ).
+    Этапы меряются таймерами instrumentation.Instrumentation. rules — весь
+    build_paragraph_report (склейка фрагментов в нем повторяется, как при проверке),
+    merge — отдельный проход склейки. Время parse — все, что не попало в остальные
+    этапы (распаковка, iterparse). RSS считается от уровня после импортов, поэтому
+    PyQt5 (только для render) не попадает в замер.
+    """
+    from checker_core import build_paragraph_report, check_section_margins, merge_logical_runs, \
+        paragraph_report_to_dict
+    from instrumentation import Instrumentation
+    from stream_engine import StreamingDocument
+    from traversal import paragraph_records
+    paragraph_detail_html = None
+    if depth >= 4:
+        try:
+            from findings_model import paragraph_detail_html
+        except ImportError:
+            pass
+
+    baseline_rss = _peak_rss_mb()
+    instr = Instrumentation()
+    phase = instr.phase
+    paragraph_count = 0
+    with instr, StreamingDocument(path) as doc:
+        for event in doc.iter_body():
+            if event[0] == 'section':
+                if depth >= 3:
+                    with phase('rules'):
+                        check_section_margins(event[2])
+                continue
+            _, p_idx, p, location = event
+            paragraph_count += 1
+            if depth < 1:
+                continue
+            with phase('styles'):
+                text, para_format, run_fonts = paragraph_records(p, doc.resolver)
+            if depth < 2 or not text.strip():
+                continue
+            with phase('merge'):
+                for _ in merge_logical_runs(run_fonts):
+                    pass
+            if depth < 3:
+                continue
+            with phase('rules'):
+                report = build_paragraph_report(p_idx, text, para_format, run_fonts, location=location)
+            if depth < 4 or not report['has_issues']:
+                continue
+            with phase('render'):
+                json.dumps(paragraph_report_to_dict(report), ensure_ascii=False)
+                if paragraph_detail_html is not None:
+                    paragraph_detail_html(report)
+    measured = instr.report()
+    timings = {stage: measured['phases'].get(stage, {'seconds': 0.0})['seconds'] for stage in STAGES}
+    timings['parse'] = measured['other_seconds']
+    return timings, paragraph_count, max(_peak_rss_mb() - baseline_rss, 0.0)
+
+
+def measure_document(path, repeat=3):
+    """{этап: {'seconds', 'paragraphs_per_sec', 'peak_rss_mb'}} и итог 'total'.
+
+    Время этапа — лучшее из repeat полных проходов; пиковый RSS этапа — прирост
+    у отдельного процесса, выполняющего конвейер до этого этапа включительно.
+    """
+    context = get_context('spawn')
+
+    def in_subprocess(depth):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            return executor.submit(run_pipeline, path, depth).result()
+
+    best = {}
+    paragraph_count = 0
+    for _ in range(repeat):
+        timings, paragraph_count, _ = in_subprocess(len(STAGES) - 1)
+        for stage, seconds in timings.items():
+            best[stage] = min(seconds, best.get(stage, seconds))
+    results = {}
+    for depth, stage in enumerate(STAGES):
+        seconds = best[stage]
+        results[stage] = {
+            'seconds': seconds,
+            'paragraphs_per_sec': paragraph_count / seconds if seconds > 0 else None,
+            'peak_rss_mb': in_subprocess(depth)[2],
+        }
+    # Склейка входит и в rules, поэтому отдельный проход merge в итог не складывается
+    total = sum(best.values()) - best['merge']
+    results['total'] = {
+        'seconds': total,
+        'paragraphs_per_sec': paragraph_count / total if total > 0 else None,
+        'peak_rss_mb': max(r['peak_rss_mb'] for r in results.values()),
+    }
+    return results
+
+
+def print_results(label, results, out=sys.stdout):
+    print(f"\n{label}", file=out)
+    print(f"{'этап':<8} {'время, с':>10} {'абзацев/с':>12} {'пик RSS, МиБ':>13}", file=out)
+    for stage in STAGES + ('total',):
+        r = results[stage]
+        rate = f"{r['paragraphs_per_sec']:.0f}" if r['paragraphs_per_sec'] else '-'
+        print(f"{stage:<8} {r['seconds']:>10.3f} {rate:>12} {r['peak_rss_mb']:>13.1f}", file=out)
+
+
+def find_regressions(current, baseline, tolerance, min_delta):
+    """Этапы, ставшие медленнее базового замера более чем в tolerance раз и более чем на min_delta секунд."""
+    regressions = []
+    for label, stages in current.items():
+        for stage, r in stages.items():
+            base = baseline.get(label, {}).get(stage)
+            if base is None:
+                continue
+            if r['seconds'] > base['seconds'] * tolerance and r['seconds'] - base['seconds'] > min_delta:
+                regressions.append(f"{label} / {stage}: {base['seconds']:.3f} с -> {r['seconds']:.3f} с")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры проверки по этапам на синтетических документах")
+    parser.add_argument('--paragraphs', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--runs-per-paragraph', type=int, default=8)
+    parser.add_argument('--style-depth', type=int, default=4)
+    parser.add_argument('--table-every', type=int, default=50)
+    parser.add_argument('--violation-rate', type=float, default=0.05)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', metavar='PATH', help="сохранить результаты в JSON")
+    parser.add_argument('--compare', metavar='PATH', help="сравнить с сохраненным JSON")
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help="допустимое замедление этапа относительно базового замера")
+    parser.add_argument('--min-delta', type=float, default=0.1,
+                        help="замедление меньше этого числа секунд регрессией не считается")
+    args = parser.parse_args(argv)
+
+    all_results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for paragraphs in args.paragraphs:
+            path = os.path.join(tmp_dir, f'bench_{paragraphs}.docx')
+            generate_document(path, paragraphs, args.runs_per_paragraph, args.style_depth,
+                              args.table_every, args.violation_rate)
+            label = (f"{paragraphs} абзацев, {args.runs_per_paragraph} w:r/абзац, "
+                     f"стили глубины {args.style_depth}, таблица на {args.table_every} абзацев")
+            all_results[label] = measure_document(path, args.repeat)
+            print_results(label, all_results[label])
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(all_results, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = find_regressions(all_results, json.load(f), args.tolerance, args.min_delta)
+        if regressions:
+            print("\nРегрессии производительности:", *regressions, sep='\n  ')
+            return 1
+        print("\nРегрессий нет.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
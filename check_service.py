@@ -0,0 +1,452 @@
+"""Локальный сервис проверки .docx с постоянным пулом процессов и JSON API.
+
+Процессы-исполнители запускаются один раз и заранее импортируют ядро проверки
+и профили требований, поэтому запрос не платит за запуск интерпретатора и
+импорт python-docx. Очередь ограничена: когда она заполнена, сервис сразу
+отвечает 503 с Retry-After вместо того, чтобы копить запросы.
+
+    python check_service.py --port 8765 -j 4 --root /srv/uploads
+
+API:
+    POST /check            тело — сам .docx (upload); имя файла — ?name=...
+    POST /check            JSON {"path": "..."} — файл внутри --root
+                           профили: ?profile=a&profile=b или "profiles" в JSON
+    GET  /health           готовность и загрузка пула
+    GET  /metrics          глубина очереди, задержки p50/p95/p99, пропускная способность
+
+С --instrument в ответ добавляется 'instrumentation': время этапов и счетчики
+(instrumentation.py), чтобы находить документы, на которых проверка медленная.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import stream_engine
+from batch_check import terminate_pool
+from checker_core import count_issues, paragraph_report_to_dict
+from findings import document_findings
+from instrumentation import NULL, Instrumentation
+from result_cache import CACHE_ERRORS, DEFAULT_CACHE_DIR, ResultCache
+from rule_profiles import rule_set
+
+DEFAULT_PORT = 8765
+DEFAULT_MAX_UPLOAD_MB = 50
+# Окно для перцентилей задержки и пропускной способности
+LATENCY_WINDOW = 1024
+THROUGHPUT_WINDOW_SEC = 60.0
+
+DOCX_CONTENT_TYPES = ('application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+                      'application/octet-stream')
+
+
+# --- Процессы-исполнители ---
+
+_worker_cache = None
+
+
+def _init_worker(cache_dir, profiles_path):
+    """Компиляция профилей и открытие кэша при старте процесса, а не на первом запросе."""
+    global _worker_cache
+    rule_set(None, profiles_path)
+    if cache_dir is not None:
+        _worker_cache = ResultCache(cache_dir)
+
+
+def _warm_up():
+    return os.getpid()
+
+
+def _report_to_json(report):
+    data = dict(report)
+    data['paragraphs'] = [paragraph_report_to_dict(p) for p in report['paragraphs']]
+    # Те же записи, что пишет batch_check.py --format ndjson
+    data['findings'] = list(document_findings(report['path'], report))
+    issues = count_issues(report)
+    data['issues'] = issues
+    data['status'] = 'fail' if issues else 'pass'
+    return data
+
+
+def check_document(source, name, profiles=None, profiles_path=None, instrument=False):
+    """Проверяет .docx в процессе-исполнителе; source — путь или содержимое файла (bytes).
+
+    instrument=True добавляет в ответ 'instrumentation' — время этапов и счетчики.
+    """
+    started = time.perf_counter()
+    doc = io.BytesIO(source) if isinstance(source, bytes) else source
+    instr = Instrumentation() if instrument else NULL
+    with instr:
+        report = stream_engine.analyze_document(doc, cache=_worker_cache, rules=rule_set(profiles, profiles_path),
+                                                instrumentation=instr)
+        report['path'] = name
+        with instr.phase('output'):
+            data = _report_to_json(report)
+    if instrument:
+        data['instrumentation'] = instr.report()
+    data['elapsed'] = time.perf_counter() - started
+    return data
+
+
+# --- Метрики ---
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class ServiceMetrics:
+    """Счетчики сервиса; все методы потокобезопасны."""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._finished_at = deque()
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def accepted(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def finished(self, latency, ok):
+        now = time.time()
+        with self._lock:
+            self.in_flight -= 1
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+            self._latencies.append(latency)
+            self._finished_at.append(now)
+            while self._finished_at and now - self._finished_at[0] > THROUGHPUT_WINDOW_SEC:
+                self._finished_at.popleft()
+
+    def snapshot(self):
+        now = time.time()
+        with self._lock:
+            latencies = sorted(self._latencies)
+            recent = sum(1 for t in self._finished_at if now - t <= THROUGHPUT_WINDOW_SEC)
+            in_flight = self.in_flight
+            counters = {'completed': self.completed, 'failed': self.failed, 'rejected': self.rejected}
+        window = min(THROUGHPUT_WINDOW_SEC, now - self.started) or 1.0
+        return {
+            'uptime_sec': round(now - self.started, 1),
+            'workers': self.workers,
+            'in_flight': in_flight,
+            # Запросы сверх числа исполнителей ждут в очереди пула
+            'queue_depth': max(0, in_flight - self.workers),
+            **counters,
+            'latency_ms': {name: None if value is None else round(value * 1000, 1)
+                           for name, value in (('p50', _percentile(latencies, 0.50)),
+                                               ('p95', _percentile(latencies, 0.95)),
+                                               ('p99', _percentile(latencies, 0.99)))},
+            'throughput_per_sec': round(recent / window, 2),
+        }
+
+
+# --- HTTP ---
+
+class ServiceError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class CheckService:
+    """Пул исполнителей, ограничение очереди и метрики; не зависит от HTTP."""
+
+    def __init__(self, workers, max_queue, timeout=None, root=None, cache_dir=None, profiles_path=None,
+                 instrument=False):
+        self.workers = workers
+        self.instrument = instrument
+        self.timeout = timeout
+        self.root = os.path.realpath(root) if root else None
+        self.profiles_path = profiles_path
+        self._initargs = (cache_dir, profiles_path)
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._pool_lock = threading.Lock()
+        self.metrics = ServiceMetrics(workers)
+        # False, пока пул пересоздается после аварии исполнителя (/health отвечает 503)
+        self.ready = False
+        self._executor = self._start_pool()
+        self.ready = True
+
+    def _start_pool(self):
+        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=self._initargs)
+        # Запускаем все процессы сразу, чтобы первый запрос не ждал импорта
+        for future in [executor.submit(_warm_up) for _ in range(self.workers)]:
+            future.result()
+        return executor
+
+    def _restart_pool(self, broken, kill=False):
+        """Заменяет пул broken новым; kill=True — сначала завершает его процессы.
+
+        Запросы, которые были в пуле, остановленном через kill, повторяются в новом
+        (см. _retried), поэтому зависшая проверка не отнимает у них ответ.
+        """
+        with self._pool_lock:
+            if self._executor is broken:
+                self.ready = False
+                try:
+                    if kill:
+                        broken.recycled = True
+                        terminate_pool(broken)
+                    else:
+                        broken.shutdown(wait=False, cancel_futures=True)
+                    self._executor = self._start_pool()
+                finally:
+                    self.ready = True
+
+    @staticmethod
+    def _retried(future, executor):
+        """Задача не выполнена только потому, что пул остановлен из-за чужого --timeout."""
+        if not getattr(executor, 'recycled', False) or getattr(future, 'abandoned', False):
+            return False
+        return future.cancelled() or isinstance(future.exception(), BrokenProcessPool)
+
+    def resolve_path(self, path):
+        if self.root is None:
+            raise ServiceError(HTTPStatus.FORBIDDEN, "проверка по пути отключена (запустите сервис с --root)")
+        try:
+            full = os.path.realpath(os.path.join(self.root, path))
+        except ValueError:
+            # Например, нулевой байт в пути
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "недопустимый путь") from None
+        if os.path.commonpath([full, self.root]) != self.root:
+            raise ServiceError(HTTPStatus.FORBIDDEN, "путь вне каталога --root")
+        if not os.path.isfile(full):
+            raise ServiceError(HTTPStatus.NOT_FOUND, f"файл не найден: {path}")
+        return full
+
+    def check(self, source, name, profiles=None):
+        if isinstance(profiles, str):
+            profiles = [profiles]
+        try:
+            rule_set(profiles, self.profiles_path)
+        except (ValueError, TypeError) as e:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, str(e)) from None
+        if not self._slots.acquire(blocking=False):
+            self.metrics.reject()
+            raise ServiceError(HTTPStatus.SERVICE_UNAVAILABLE, "очередь проверки заполнена, повторите позже")
+        self.metrics.accepted()
+        started = time.perf_counter()
+        while True:
+            try:
+                # Пока пул пересоздается, новая задача ждет его, а не попадает в остановленный
+                with self._pool_lock:
+                    executor = self._executor
+                    future = executor.submit(check_document, source, name, profiles, self.profiles_path,
+                                             self.instrument)
+            except BrokenProcessPool:
+                self._job_done(started, False)
+                self._restart_pool(executor)
+                raise ServiceError(HTTPStatus.INTERNAL_SERVER_ERROR,
+                                   "процесс проверки аварийно завершился") from None
+            except BaseException:
+                self._job_done(started, False)
+                raise
+            # Место в очереди освобождается, когда исполнитель действительно закончил
+            # (или остановлен по --timeout), а при повторе в новом пуле остается за запросом
+            def on_done(done, executor=executor):
+                if not self._retried(done, executor):
+                    self._job_done(started, not done.cancelled() and done.exception() is None
+                                   and not getattr(done, 'abandoned', False))
+            future.add_done_callback(on_done)
+            timeout = None if self.timeout is None else max(0.0, self.timeout - (time.perf_counter() - started))
+            try:
+                return future.result(timeout=timeout)
+            except FutureTimeoutError:
+                future.abandoned = True
+                if not future.cancel():
+                    # Проверка уже идет: остановить ее можно только вместе с процессом,
+                    # иначе он и место в очереди заняты до ее конца
+                    self._restart_pool(executor, kill=True)
+                raise ServiceError(HTTPStatus.GATEWAY_TIMEOUT, "проверка не уложилась в --timeout") from None
+            except Exception as e:
+                if self._retried(future, executor):
+                    continue
+                if isinstance(e, BrokenProcessPool):
+                    # Исполнитель упал (например, нехватка памяти): пересоздаем пул
+                    self._restart_pool(executor)
+                    raise ServiceError(HTTPStatus.INTERNAL_SERVER_ERROR,
+                                       "процесс проверки аварийно завершился") from None
+                raise ServiceError(HTTPStatus.UNPROCESSABLE_ENTITY, f"{type(e).__name__}: {e}") from None
+
+    def _job_done(self, started, ok):
+        self.metrics.finished(time.perf_counter() - started, ok)
+        self._slots.release()
+
+    def health(self):
+        snapshot = self.metrics.snapshot()
+        return {'status': 'ok' if self.ready else 'restarting', 'workers': self.workers,
+                'in_flight': snapshot['in_flight'], 'queue_depth': snapshot['queue_depth']}
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+class CheckRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'tusur-doc-checker'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, data, headers=()):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message):
+        headers = (('Retry-After', '1'),) if status == HTTPStatus.SERVICE_UNAVAILABLE else ()
+        self._send_json(status, {'error': message}, headers)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == '/health':
+            health = self.service.health()
+            self._send_json(HTTPStatus.OK if health['status'] == 'ok' else HTTPStatus.SERVICE_UNAVAILABLE, health)
+        elif path == '/metrics':
+            self._send_json(HTTPStatus.OK, self.service.metrics.snapshot())
+        else:
+            self._send_error(HTTPStatus.NOT_FOUND, f"нет ресурса {path}")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != '/check':
+            self._send_error(HTTPStatus.NOT_FOUND, f"нет ресурса {url.path}")
+            return
+        try:
+            source, name, profiles = self._read_check_request(parse_qs(url.query))
+            result = self.service.check(source, name, profiles)
+        except ServiceError as e:
+            self._send_error(e.status, str(e))
+            return
+        self._send_json(HTTPStatus.OK, result)
+
+    def _read_check_request(self, query):
+        length = self.headers.get('Content-Length')
+        if length is None:
+            raise ServiceError(HTTPStatus.LENGTH_REQUIRED, "нужен заголовок Content-Length")
+        try:
+            length = int(length)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "неверный заголовок Content-Length")
+        if length > self.server.max_upload_bytes:
+            # Тело не читаем: соединение после ответа закрывается
+            self.close_connection = True
+            raise ServiceError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                               f"файл больше {self.server.max_upload_bytes // (1024 * 1024)} МиБ")
+        body = self.rfile.read(length)
+        profiles = query.get('profile')
+        content_type = self.headers.get('Content-Type', '').split(';')[0].strip()
+        if content_type == 'application/json':
+            try:
+                request = json.loads(body)
+                path = request['path']
+            except (ValueError, KeyError, TypeError):
+                raise ServiceError(HTTPStatus.BAD_REQUEST, "ожидается JSON вида {\"path\": \"...\"}") from None
+            if not isinstance(path, str):
+                raise ServiceError(HTTPStatus.BAD_REQUEST, "ожидается JSON вида {\"path\": \"...\"}")
+            profiles = request.get('profiles', profiles)
+            return self.service.resolve_path(path), path, profiles
+        if content_type and content_type not in DOCX_CONTENT_TYPES:
+            raise ServiceError(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, f"неподдерживаемый Content-Type: {content_type}")
+        if not body:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "пустое тело запроса")
+        return body, query.get('name', ['upload.docx'])[0], profiles
+
+
+class CheckHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service, max_upload_bytes, quiet=False):
+        super().__init__(address, CheckRequestHandler)
+        self.service = service
+        self.max_upload_bytes = max_upload_bytes
+        self.quiet = quiet
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Локальный сервис проверки оформления .docx по ОС ТУСУР")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help="число процессов-исполнителей (по умолчанию — все ядра)")
+    parser.add_argument('--max-queue', type=int, default=None,
+                        help="сколько запросов может ждать свободного исполнителя (по умолчанию 2 на процесс)")
+    parser.add_argument('--timeout', type=float, default=None, help="предел времени проверки одного файла, с; зависшая проверка "
+                             "останавливается перезапуском пула, остальные запросы повторяются")
+    parser.add_argument('--max-upload-mb', type=int, default=DEFAULT_MAX_UPLOAD_MB)
+    parser.add_argument('--root', metavar='DIR', help="разрешить проверку файлов по пути внутри DIR")
+    parser.add_argument('--cache', action='store_true', help="кэшировать результаты")
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help=f"каталог кэша, включает --cache (по умолчанию {DEFAULT_CACHE_DIR})")
+    parser.add_argument('--profiles-file', metavar='PATH', help="файл профилей (по умолчанию profiles.json)")
+    parser.add_argument('--quiet', action='store_true', help="не писать журнал запросов")
+    parser.add_argument('--instrument', action='store_true',
+                        help="добавлять в ответ время этапов и счетчики проверки (instrumentation.py)")
+    args = parser.parse_args(argv)
+
+    try:
+        rule_set(None, args.profiles_file)
+    except (OSError, ValueError) as e:
+        print(f"Ошибка в профилях требований: {e}", file=sys.stderr)
+        return 2
+    cache_dir = None
+    if args.cache or args.cache_dir:
+        cache_dir = args.cache_dir or DEFAULT_CACHE_DIR
+        try:
+            ResultCache(cache_dir).close()
+        except CACHE_ERRORS as e:
+            print(f"Кэш результатов недоступен: {e}", file=sys.stderr)
+            return 2
+    max_queue = args.max_queue if args.max_queue is not None else 2 * args.jobs
+    service = CheckService(args.jobs, max_queue, timeout=args.timeout, root=args.root, cache_dir=cache_dir,
+                           profiles_path=args.profiles_file, instrument=args.instrument)
+    server = CheckHTTPServer((args.host, args.port), service, args.max_upload_mb * 1024 * 1024, quiet=args.quiet)
+    print(f"Сервис проверки: http://{args.host}:{server.server_port} "
+          f"(исполнителей: {args.jobs}, очередь: {max_queue})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
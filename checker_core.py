@@ -0,0 +1,309 @@
+from docx import Document
+
+from instrumentation import NULL
+from rule_profiles import default_profile, default_rule_set
+from style_resolver import StyleResolver
+from traversal import BodyWalker, container_of, paragraph_records
+
+# Требования к оформлению описаны профилями в profiles.json (см. rule_profiles.py).
+# Ядро проверки без зависимостей от Qt: используется и окном (main_app.py),
+# и пакетной проверкой (batch_check.py).
+
+NO_SECTIONS_ERROR = "Не удалось проверить поля: в документе нет секций."
+
+
+def check_font_and_size(run_text_segment, font_name, font_size_pt, profile=None):
+    return (profile or default_profile()).font_errors(run_text_segment, font_name, font_size_pt)
+
+
+def check_section_margins(section, profile=None):
+    """section — Section из python-docx или запись с атрибутами *_margin (Length); None — секций нет."""
+    if section is None:
+        return [NO_SECTIONS_ERROR]
+    return (profile or default_profile()).margin_errors(section)
+
+
+def are_effective_fonts_same(run1_font_name, run1_font_size, run2_font_name, run2_font_size):
+    size_matches = False
+    if run1_font_size is None and run2_font_size is None:
+        size_matches = True
+    elif run1_font_size is not None and run2_font_size is not None and abs(run1_font_size - run2_font_size) < 0.1:
+        size_matches = True
+    return run1_font_name == run2_font_name and size_matches
+
+
+class LogicalRun:
+    """Логический фрагмент: подряд идущие w:r с одинаковым эффективным шрифтом.
+
+    На абзацах, вставленных из других редакторов, их тысячи, поэтому без __dict__.
+    """
+    __slots__ = ('text', 'font_name', 'font_size', 'error_details', 'fragment_number')
+
+    def __init__(self, text, font_name, font_size, error_details, fragment_number=None):
+        self.text = text
+        self.font_name = font_name
+        self.font_size = font_size
+        self.error_details = error_details
+        self.fragment_number = fragment_number
+
+    @property
+    def has_font_errors(self):
+        return bool(self.error_details)
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+def merge_logical_runs(run_fonts):
+    """Склеивает соседние w:r с одинаковым эффективным шрифтом за один проход.
+
+    run_fonts — итерируемое (текст, шрифт, размер); каждый элемент читается ровно
+    один раз. Отдает (текст, шрифт, размер) для групп с непустым текстом; шрифт
+    группы — шрифт ее первого w:r. Текст собирается через join, без +=.
+    """
+    pieces = []
+    group_name = group_size = None
+    for run_text, font_name, font_size in run_fonts:
+        if pieces and (font_name != group_name or not (
+                font_size == group_size or
+                are_effective_fonts_same(group_name, group_size, font_name, font_size))):
+            text = ''.join(pieces)
+            if text.strip():
+                yield text, group_name, group_size
+            pieces = []
+        if not pieces:
+            group_name, group_size = font_name, font_size
+        pieces.append(run_text)
+    if pieces:
+        text = ''.join(pieces)
+        if text.strip():
+            yield text, group_name, group_size
+
+
+def build_paragraph_report(p_idx, para_text, para_format, run_fonts, rules=None, location=None):
+    """Проверяет один абзац и возвращает данные для отчета (см. analyze_document).
+
+    run_fonts — последовательность (текст, шрифт, размер в пт) по прямым w:r абзаца
+    с уже вычисленным эффективным шрифтом; общая точка для обоих движков разбора.
+    rules — rule_profiles.RuleSet; подробный отчет строится по основному профилю,
+    а для остальных в 'other_profiles' отмечается только наличие замечаний.
+    location — место абзаца (см. traversal.py); от него зависит, какие правила применяются.
+    """
+    rules = rules or default_rule_set()
+    profile = rules.primary
+    container = container_of(location)
+    para_preview = para_text[:35].strip().replace('\n', ' ')
+    if len(para_text) > 35: para_preview += "..."
+
+    merged = merge_logical_runs(run_fonts)
+    if rules.extra:
+        # Склеенные фрагменты нужны еще и дополнительным профилям
+        merged = list(merged)
+    logical_runs = []
+    has_font_errors = False
+    fragment_number = 0
+    check_fonts = container in profile.font_in
+    for text, font_name, font_size in merged:
+        font_errors = profile.font_errors(text, font_name, font_size) if check_fonts else []
+        if font_errors:
+            has_font_errors = True
+            fragment_number += 1
+            logical_runs.append(LogicalRun(text, font_name, font_size, font_errors, fragment_number))
+        else:
+            logical_runs.append(LogicalRun(text, font_name, font_size, font_errors))
+
+    general_errors = profile.paragraph_errors(para_format) if container in profile.paragraph_format_in else []
+    report = {
+        'paragraph_index': p_idx + 1,
+        'paragraph_preview': para_preview,
+        'general_errors': general_errors,
+        'logical_runs': logical_runs,
+        'has_issues': bool(general_errors) or has_font_errors,
+    }
+    if location is not None:
+        report['location'] = location
+    if rules.extra:
+        report['other_profiles'] = {other.name: other.paragraph_has_issues(para_format, merged, container)
+                                    for other in rules.extra}
+    return report
+
+
+NO_ISSUES = {'has_issues': False}
+
+
+def check_paragraph_element(p_idx, p, location, resolver, rules=None):
+    """Проверка элемента w:p (из потокового разбора или дерева python-docx)."""
+    text, para_format, run_fonts = paragraph_records(p, resolver)
+    if not text.strip():
+        return NO_ISSUES
+    return build_paragraph_report(p_idx, text, para_format, run_fonts, rules, location)
+
+
+def instrumented_paragraph_check(instrumentation):
+    """check_paragraph_element с замерами этапов styles/rules и счетчиками (instrumentation.py).
+
+    Движки выбирают ее вместо check_paragraph_element один раз на документ,
+    поэтому без замеров проверка абзаца не платит ни за таймеры, ни за флаги.
+    """
+    phase, count = instrumentation.phase, instrumentation.count
+
+    def check(p_idx, p, location, resolver, rules=None):
+        with phase('styles'):
+            text, para_format, run_fonts = paragraph_records(p, resolver)
+        count('paragraphs')
+        count('runs', len(run_fonts))
+        if not text.strip():
+            return NO_ISSUES
+        with phase('rules'):
+            report = build_paragraph_report(p_idx, text, para_format, run_fonts, rules, location)
+        count('logical_runs', len(report['logical_runs']))
+        if report['has_issues']:
+            count_findings(instrumentation, report)
+        return report
+
+    return check
+
+
+def count_findings(instrumentation, report):
+    """Счетчики findings.* по отчету абзаца с замечаниями (в том числе взятому из кэша)."""
+    instrumentation.count('findings.paragraph_format', len(report['general_errors']))
+    instrumentation.count('findings.font', sum(1 for lr in report['logical_runs'] if lr.has_font_errors))
+
+
+def paragraph_report_to_dict(report):
+    data = dict(report)
+    data['logical_runs'] = [lr.to_dict() for lr in report['logical_runs']]
+    return data
+
+
+def paragraph_report_from_dict(data, p_idx=None, location=None):
+    """Обратное к paragraph_report_to_dict; p_idx и location переносят отчет на новое место абзаца."""
+    report = dict(data)
+    report['logical_runs'] = [LogicalRun.from_dict(lr) for lr in data['logical_runs']]
+    if p_idx is not None:
+        report['paragraph_index'] = p_idx + 1
+    if location is not None:
+        report['location'] = location
+    return report
+
+
+class DocumentCheck:
+    """Результаты одного прохода по документу: общие для движков разбора и окна.
+
+    on_paragraph — функция, получающая отчеты по абзацам с замечаниями сразу по мере
+    проверки; с keep_paragraphs=False они не накапливаются в отчете документа.
+    """
+
+    def __init__(self, rules=None, on_paragraph=None, keep_paragraphs=True):
+        self.rules = rules or default_rule_set()
+        self.on_paragraph = on_paragraph
+        self.keep_paragraphs = keep_paragraphs
+        self.paragraphs = []
+        self.sections = []
+        # {профиль: абзацев с замечаниями}
+        self.profile_counts = dict.fromkeys(self.rules.names, 0)
+
+    def add_paragraph(self, report):
+        if report['has_issues']:
+            self.profile_counts[self.rules.primary.name] += 1
+            if self.keep_paragraphs:
+                self.paragraphs.append(report)
+            if self.on_paragraph is not None:
+                self.on_paragraph(report)
+        for name, has_issues in report.get('other_profiles', {}).items():
+            if has_issues:
+                self.profile_counts[name] += 1
+
+    def add_section(self, section):
+        self.sections.append(section)
+
+    def section_margin_errors(self, profile=None):
+        """Замечания по полям всех секций: [{'section': номер или None, 'message', 'text'}].
+
+        'text' — строка для отчета; при нескольких секциях в ней указан номер раздела.
+        """
+        profile = profile or self.rules.primary
+        if not self.sections:
+            return [{'section': None, 'message': NO_SECTIONS_ERROR, 'text': f"Поля документа: {NO_SECTIONS_ERROR}"}]
+        single = len(self.sections) == 1
+        return [{'section': section_no, 'message': err,
+                 'text': f"Поля документа: {err}" if single else f"Поля раздела {section_no}: {err}"}
+                for section_no, section in enumerate(self.sections, 1)
+                for err in check_section_margins(section, profile)]
+
+    def document_report(self, doc_path, paragraph_count, instrumentation=NULL):
+        """Итоговый отчет; 'profiles' — число замечаний по каждому профилю, то есть
+        каким требованиям файл соответствует."""
+        with instrumentation.phase('report'):
+            report = self._document_report(doc_path, paragraph_count)
+        instrumentation.count('sections', report['section_count'])
+        instrumentation.count('findings.page_margins', len(report['section_margin_errors']))
+        return report
+
+    def _document_report(self, doc_path, paragraph_count):
+        section_margin_errors = self.section_margin_errors()
+        profiles = {}
+        for profile in self.rules.profiles:
+            if profile is self.rules.primary:
+                profile_margin_errors = section_margin_errors
+            else:
+                profile_margin_errors = self.section_margin_errors(profile)
+            profiles[profile.name] = len(profile_margin_errors) + self.profile_counts[profile.name]
+        return {
+            'path': str(doc_path),
+            'paragraph_count': paragraph_count,
+            'section_count': len(self.sections),
+            'document_level_errors': [error['text'] for error in section_margin_errors],
+            'section_margin_errors': section_margin_errors,
+            'paragraphs': self.paragraphs,
+            'issue_paragraph_count': self.profile_counts[self.rules.primary.name],
+            'profile': self.rules.primary.name,
+            'profiles': profiles,
+        }
+
+
+def part_element_loader(document):
+    """load_part для traversal.BodyWalker поверх открытого python-docx Document."""
+    related_parts = document.part.related_parts
+
+    def load_part(r_id):
+        part = related_parts.get(r_id)
+        return getattr(part, 'element', None)
+
+    return load_part
+
+
+def analyze_document(doc_path, rules=None, on_paragraph=None, instrumentation=NULL):
+    """Полная проверка .docx без GUI за один обход: тело, таблицы, колонтитулы, все секции.
+
+    Возвращает словарь с ключами 'path', 'paragraph_count' (абзацы тела вместе с
+    таблицами), 'section_count', 'document_level_errors' (строки), 'section_margin_errors'
+    (то же с номерами разделов), 'paragraphs' (отчеты build_paragraph_report по
+    проблемным абзацам, с 'location'), 'issue_paragraph_count', 'profile' (основной
+    профиль) и 'profiles' (число замечаний по каждому профилю rules).
+    Если задан on_paragraph, отчеты по абзацам передаются ему сразу и в 'paragraphs'
+    не накапливаются. instrumentation — instrumentation.Instrumentation для замеров.
+    Тот же формат отдает stream_engine.analyze_document.
+    """
+    with instrumentation.phase('open'):
+        document = Document(doc_path)
+        resolver = StyleResolver.from_document(document)
+    check_paragraph = instrumented_paragraph_check(instrumentation) if instrumentation.enabled \
+        else check_paragraph_element
+    check = DocumentCheck(rules, on_paragraph, keep_paragraphs=on_paragraph is None)
+    walker = BodyWalker(part_element_loader(document))
+    for event in walker.walk(document.element.body):
+        if event[0] == 'section':
+            check.add_section(event[2])
+            continue
+        _, p_idx, p, location = event
+        check.add_paragraph(check_paragraph(p_idx, p, location, resolver, check.rules))
+    return check.document_report(doc_path, walker.paragraph_count, instrumentation)
+
+
+def count_issues(report):
+    return len(report['document_level_errors']) + report['issue_paragraph_count']
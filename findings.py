@@ -0,0 +1,190 @@
+"""Машиночитаемые замечания: схема записей и потоковая запись в NDJSON, JSON и HTML.
+
+Каждое замечание — отдельная запись-словарь, по документу в конце идет итоговая
+запись. Записи пишутся сразу по мере проверки, поэтому отчет по тысячам
+документов уходит в файл или stdout без накопления в памяти. При параллельной
+проверке записи разных документов перемежаются; итог документа всегда идет после
+его замечаний. HTML строится из тех же записей.
+
+Запись замечания ("record": "finding"):
+    document   путь к документу
+    rule       page_margins | paragraph_format | font
+    section    номер раздела (None — в документе нет секций)
+    paragraph  номер абзаца (None для полей); в колонтитуле — номер внутри колонтитула
+    location   место абзаца (см. traversal.py) или None
+    place      то же для человека: «таблица 2, строка 1, ячейка 3»
+    fragment   номер фрагмента с ошибкой шрифта в абзаце или None
+    text       текст фрагмента (rule=font) или начало абзаца
+    message    замечание
+    font, size_pt  фактические шрифт и размер (только rule=font)
+Итоговая запись ("record": "summary"): schema, document, status (pass/fail/error),
+issues, paragraph_count, section_count, profile, profiles, elapsed, error.
+"""
+import html
+import json
+
+from traversal import location_label
+
+SCHEMA_VERSION = 1
+
+RULE_MARGINS = 'page_margins'
+RULE_PARAGRAPH = 'paragraph_format'
+RULE_FONT = 'font'
+
+_RULE_TITLES = {
+    RULE_MARGINS: 'Поля страницы',
+    RULE_PARAGRAPH: 'Параметры абзаца',
+    RULE_FONT: 'Шрифт/размер',
+}
+
+
+def margin_findings(document, section_margin_errors):
+    for error in section_margin_errors:
+        yield {'record': 'finding', 'document': document, 'rule': RULE_MARGINS, 'section': error['section'],
+               'paragraph': None, 'location': None, 'place': '', 'fragment': None, 'text': '',
+               'message': error['message']}
+
+
+def paragraph_findings(document, para_report):
+    """Записи по отчету build_paragraph_report: параметры абзаца, затем фрагменты с ошибками шрифта."""
+    location = para_report.get('location')
+    base = {'record': 'finding', 'document': document, 'rule': RULE_PARAGRAPH,
+            'section': location['section'] if location else None,
+            'paragraph': para_report['paragraph_index'], 'location': location, 'place': location_label(location),
+            'fragment': None, 'text': para_report['paragraph_preview']}
+    for err in para_report['general_errors']:
+        yield dict(base, message=err)
+    for lr_data in para_report['logical_runs']:
+        if lr_data.has_font_errors:
+            yield dict(base, rule=RULE_FONT, fragment=lr_data.fragment_number, text=lr_data.text,
+                       message='; '.join(lr_data.error_details), font=lr_data.font_name, size_pt=lr_data.font_size)
+
+
+def summary_record(result):
+    """Итог по документу из результата batch_check.check_file (или совместимого словаря)."""
+    return {'record': 'summary', 'schema': SCHEMA_VERSION, 'document': result['path'],
+            'status': result['status'], 'issues': result['issues'],
+            'paragraph_count': result['paragraph_count'], 'section_count': result.get('section_count', 0),
+            'profile': result.get('profile'), 'profiles': result.get('profiles', {}),
+            'elapsed': round(result['elapsed'], 4), 'error': result.get('error')}
+
+
+def document_findings(document, report):
+    """Все записи замечаний по готовому отчету документа (без итоговой)."""
+    yield from margin_findings(document, report['section_margin_errors'])
+    for para_report in report['paragraphs']:
+        yield from paragraph_findings(document, para_report)
+
+
+# --- Запись ---
+
+class NDJSONWriter:
+    """Одна запись — одна строка JSON."""
+
+    def __init__(self, stream, flush_each=False):
+        self._stream = stream
+        self._flush_each = flush_each
+
+    def write(self, record):
+        self._stream.write(json.dumps(record, ensure_ascii=False))
+        self._stream.write('\n')
+        if self._flush_each:
+            self._stream.flush()
+
+    def close(self):
+        self._stream.flush()
+
+
+class JSONWriter:
+    """Массив JSON с теми же записями; открывается и закрывается потоково."""
+
+    def __init__(self, stream, flush_each=False):
+        self._stream = stream
+        self._flush_each = flush_each
+        self._count = 0
+        self._stream.write('[')
+
+    def write(self, record):
+        self._stream.write(',\n' if self._count else '\n')
+        self._stream.write(json.dumps(record, ensure_ascii=False))
+        self._count += 1
+        if self._flush_each:
+            self._stream.flush()
+
+    def close(self):
+        self._stream.write('\n]\n')
+        self._stream.flush()
+
+
+class HTMLWriter:
+    """HTML-отчет из записей: таблица замечаний и итог по каждому документу.
+
+    При параллельной проверке записи разных документов перемежаются, поэтому строки
+    таблицы копятся до итоговой записи своего документа и пишутся одним блоком.
+    """
+
+    _HEAD = ("<!DOCTYPE html>\n<html><head><meta charset='utf-8'><title>Проверка оформления</title><style>"
+             "body{font-family:sans-serif}table{border-collapse:collapse;width:100%;margin-bottom:8px}"
+             "td,th{border:1px solid #ccc;padding:2px 6px;text-align:left;vertical-align:top}"
+             ".page_margins{color:purple}.paragraph_format{color:blue}.font{color:red}"
+             ".pass{color:green}.fail{color:red}.error{color:gray}</style></head><body>\n")
+    _TABLE = ("<table><tr><th>Абзац</th><th>Место</th><th>Тип</th><th>Фрагмент</th>"
+              "<th>Замечание</th></tr>\n")
+
+    def __init__(self, stream, flush_each=False):
+        self._stream = stream
+        self._flush_each = flush_each
+        # {документ: строки таблицы до итоговой записи}
+        self._rows = {}
+        self._stream.write(self._HEAD)
+
+    def _write_document(self, document, rows, status_html=''):
+        self._stream.write(f"<h3>{html.escape(document)}</h3>\n{self._TABLE}")
+        self._stream.writelines(rows)
+        self._stream.write(f"</table>\n{status_html}")
+
+    def write(self, record):
+        rows = self._rows.setdefault(record['document'], [])
+        if record['record'] == 'finding':
+            fragment = html.escape(record['text'])
+            if record['fragment'] is not None:
+                fragment = f"({record['fragment']}) {fragment}"
+            paragraph = '' if record['paragraph'] is None else record['paragraph']
+            place = record['place'] or (f"раздел {record['section']}" if record['rule'] == RULE_MARGINS and
+                                        record['section'] else '')
+            rows.append(f"<tr><td>{paragraph}</td><td>{html.escape(place)}</td>"
+                        f"<td class='{record['rule']}'>{_RULE_TITLES[record['rule']]}</td>"
+                        f"<td>{fragment}</td><td>{html.escape(record['message'])}</td></tr>\n")
+            return
+        if record['status'] == 'error':
+            status = f"ошибка: {html.escape(record['error'] or '')}"
+        else:
+            status = f"замечаний: {record['issues']}, абзацев: {record['paragraph_count']}"
+        self._write_document(record['document'], self._rows.pop(record['document']),
+                             f"<p class='{record['status']}'>{status}</p>\n")
+        if self._flush_each:
+            self._stream.flush()
+
+    def close(self):
+        # Документы без итоговой записи (проверка прервана)
+        for document, rows in self._rows.items():
+            self._write_document(document, rows)
+        self._rows = {}
+        self._stream.write("</body></html>\n")
+        self._stream.flush()
+
+
+WRITERS = {
+    'ndjson': NDJSONWriter,
+    'json': JSONWriter,
+    'html': HTMLWriter,
+}
+
+
+def write_document_report(writer, result, report=None):
+    """Записи по одному документу: замечания из report (если есть), затем итог result."""
+    if report is not None:
+        for record in document_findings(result['path'], report):
+            writer.write(record)
+    writer.write(summary_record(result))
+
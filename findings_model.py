@@ -0,0 +1,168 @@
+"""Модель замечаний для QTableView.
+
+Отчет хранится как плоский список строк-замечаний; представление запрашивает
+данные только для видимых строк, поэтому стоимость отрисовки не зависит от числа
+замечаний. HTML с подсветкой фрагментов абзаца строится только для выбранной строки.
+"""
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PyQt5.QtGui import QColor
+
+from traversal import location_label
+
+KIND_DOCUMENT = 'document'
+KIND_PARAGRAPH = 'paragraph'
+KIND_FONT = 'font'
+
+_KIND_TITLES = {
+    KIND_DOCUMENT: 'Поля страницы',
+    KIND_PARAGRAPH: 'Параметры абзаца',
+    KIND_FONT: 'Шрифт/размер',
+}
+_KIND_COLORS = {
+    KIND_DOCUMENT: QColor('purple'),
+    KIND_PARAGRAPH: QColor('blue'),
+    KIND_FONT: QColor('red'),
+}
+
+
+def escape_html(text_to_escape):
+    if text_to_escape is None: return ""
+    text_str = str(text_to_escape)
+    return text_str.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('\n', '<br/>').replace(
+        '\t', '&nbsp;&nbsp;&nbsp;&nbsp;')
+
+
+class FindingRow:
+    __slots__ = ('kind', 'paragraph', 'fragment_number', 'fragment_preview', 'message')
+
+    def __init__(self, kind, paragraph, message, fragment_number=None, fragment_preview=''):
+        self.kind = kind
+        # Отчет абзаца (общий для всех его строк) или None для замечаний по документу
+        self.paragraph = paragraph
+        self.message = message
+        self.fragment_number = fragment_number
+        self.fragment_preview = fragment_preview
+
+
+def rows_for_paragraph(para_report):
+    rows = [FindingRow(KIND_PARAGRAPH, para_report, err) for err in para_report['general_errors']]
+    for lr_data in para_report['logical_runs']:
+        if lr_data.has_font_errors:
+            run_preview_short = lr_data.text.strip()[:20]
+            if len(lr_data.text.strip()) > 20: run_preview_short += "..."
+            rows.append(FindingRow(KIND_FONT, para_report, '; '.join(lr_data.error_details),
+                                   lr_data.fragment_number, run_preview_short))
+    return rows
+
+
+def paragraph_detail_html(issue_data):
+    """Абзац с подсвеченными фрагментами и расшифровкой замечаний."""
+    para_idx = issue_data['paragraph_index']
+    para_preview_text = issue_data['paragraph_preview']
+
+    table_html = "<table width='100%' cellspacing='0' cellpadding='2'>"
+    table_html += f"<tr><td style='padding-left: 0px;'><h4 style='margin: 2px 0;'>Абзац №{para_idx} (начинается с: \"{escape_html(para_preview_text)}\")</h4></td></tr>"
+    place = location_label(issue_data.get('location'))
+    if place:
+        table_html += f"<tr><td style='padding-left: 10px;'><i>Место: {escape_html(place)}</i></td></tr>"
+
+    for err in issue_data['general_errors']:
+        table_html += f"<tr><td style='padding-left: 10px;'><font color='blue'>- Параметры абзаца: {escape_html(err)}</font></td></tr>"
+
+    if any(lr_data.has_font_errors for lr_data in issue_data['logical_runs']):
+        table_html += "<tr><td style='padding-left: 10px;'><u>- Ошибки шрифта/размера в тексте:</u></td></tr>"
+
+        highlighted_paragraph_html = []
+        for lr_data in issue_data['logical_runs']:
+            escaped_run_text = escape_html(lr_data.text)
+            if lr_data.has_font_errors and lr_data.fragment_number is not None:
+                error_marker = f" <font color='#0000CC'><b>({lr_data.fragment_number})</b></font> "
+                highlighted_paragraph_html.append(f"{error_marker}<font color='red'><b>{escaped_run_text}</b></font>")
+            elif lr_data.has_font_errors:
+                highlighted_paragraph_html.append(f"<font color='red'><b>{escaped_run_text}</b></font>")
+            else:
+                highlighted_paragraph_html.append(escaped_run_text)
+        table_html += f"<tr><td style='padding-left: 25px;'><div style='border:1px solid #ddd; padding:4px; background-color:#fff;'>{''.join(highlighted_paragraph_html)}</div></td></tr>"
+
+        table_html += "<tr><td style='padding-left: 25px;'>Детали по фрагментам с ошибками:</td></tr>"
+        for lr_data in issue_data['logical_runs']:
+            if lr_data.has_font_errors and lr_data.fragment_number is not None:
+                table_html += f"<tr><td style='padding-left: 30px;'>- Фрагмент ({lr_data.fragment_number}): {escape_html('; '.join(lr_data.error_details))}</td></tr>"
+    table_html += "</table>"
+    return table_html
+
+
+class FindingsModel(QAbstractTableModel):
+    COLUMNS = ('Абзац', 'Место', 'Тип', 'Фрагмент', 'Замечание')
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+        # Отчеты абзацев в порядке поступления: для сохранения отчета (findings.py)
+        self.paragraph_reports = []
+        self.paragraph_count = 0
+
+    def clear(self):
+        self.beginResetModel()
+        self._rows = []
+        self.paragraph_reports = []
+        self.paragraph_count = 0
+        self.endResetModel()
+
+    def add_document_errors(self, errors):
+        self._append_rows([FindingRow(KIND_DOCUMENT, None, err) for err in errors])
+
+    def add_paragraph_reports(self, reports):
+        rows = []
+        for para_report in reports:
+            rows.extend(rows_for_paragraph(para_report))
+        self.paragraph_reports.extend(reports)
+        self.paragraph_count += len(reports)
+        self._append_rows(rows)
+
+    def _append_rows(self, rows):
+        if not rows:
+            return
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+
+    def row_at(self, row):
+        return self._rows[row]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        finding = self._rows[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return '' if finding.paragraph is None else finding.paragraph['paragraph_index']
+            if column == 1:
+                return '' if finding.paragraph is None else location_label(finding.paragraph.get('location'))
+            if column == 2:
+                return _KIND_TITLES[finding.kind]
+            if column == 3:
+                if finding.fragment_number is None:
+                    return finding.fragment_preview
+                return f"#{finding.fragment_number} «{finding.fragment_preview}»"
+            return finding.message
+        if role == Qt.ForegroundRole and column == 2:
+            return _KIND_COLORS[finding.kind]
+        if role == Qt.ToolTipRole and column == 1 and finding.paragraph is not None:
+            return location_label(finding.paragraph.get('location')) or None
+        if role == Qt.ToolTipRole and column == 4:
+            return finding.message
+        return None
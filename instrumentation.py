@@ -0,0 +1,213 @@
+"""Замеры проверки по этапам: время, счетчики, пиковая память и профиль вызовов.
+
+Включаются явно (batch_check.py --instrument, сервис --instrument, флажок в окне).
+Выключенные замеры ничего не стоят: вместо Instrumentation передается NULL, а
+движки разбора выбирают инструментированную проверку абзаца один раз на документ,
+не проверяя флаг на каждом абзаце.
+
+    instr = Instrumentation(memory=True)
+    with instr.phase('styles'):
+        ...
+    instr.count('paragraphs')
+    instr.report()   # словарь для JSON
+
+Этапы (phases): open — открытие архива и разбор стилей; styles — текст и
+эффективный шрифт фрагментов; rules — склейка логических фрагментов и проверки
+профиля; report — итоговый отчет и поля разделов; output — передача замечаний
+окну (сигналы потока проверки), в поток записей batch_check.py или в JSON-ответ
+сервиса; отрисовка в окне замеряется отдельно, этапом render.
+other — остаток: XML-разбор тела и обход таблиц/колонтитулов.
+
+С кэшем результатов счетчики findings.* и sections считают и то, что взято из
+кэша, paragraphs — и абзацы из кэша (кроме попадания документа целиком), а runs
+и logical_runs — только заново проверенные абзацы.
+"""
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# Сколько самых затратных функций профиля попадает в отчет
+PROFILE_TOP = 25
+
+
+class _PhaseStats:
+    __slots__ = ('seconds', 'calls', 'peak_bytes')
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.calls = 0
+        self.peak_bytes = 0
+
+
+class Instrumentation:
+    """Замеры одной проверки (или суммы нескольких, см. merge)."""
+    enabled = True
+
+    def __init__(self, memory=False, profile=False):
+        self.memory = memory
+        self.phases = {}
+        self.counters = {}
+        self._started = None
+        self._elapsed = 0.0
+        self._profiler = cProfile.Profile() if profile else None
+        self._own_tracemalloc = False
+        # reset_peak в этапах сбрасывает и общий пик, поэтому он копится здесь
+        self._peak_bytes = 0
+
+    def start(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_tracemalloc = True
+        if self._profiler is not None:
+            self._profiler.enable()
+        self._started = time.perf_counter()
+        return self
+
+    def stop(self):
+        if self._started is None:
+            return self
+        self._elapsed += time.perf_counter() - self._started
+        self._started = None
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self.memory and tracemalloc.is_tracing():
+            self._peak_bytes = max(self._peak_bytes, tracemalloc.get_traced_memory()[1])
+        if self._own_tracemalloc:
+            tracemalloc.stop()
+            self._own_tracemalloc = False
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @contextmanager
+    def phase(self, name):
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = _PhaseStats()
+        tracing = self.memory and tracemalloc.is_tracing()
+        if tracing:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats.seconds += time.perf_counter() - started
+            stats.calls += 1
+            if tracing:
+                peak = tracemalloc.get_traced_memory()[1]
+                stats.peak_bytes = max(stats.peak_bytes, peak - base)
+                self._peak_bytes = max(self._peak_bytes, peak)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge(self, report):
+        """Добавляет отчет другой проверки (словарь report()) — для итога по пакету."""
+        self._elapsed += report['total_seconds']
+        for name, data in report['phases'].items():
+            stats = self.phases.get(name)
+            if stats is None:
+                stats = self.phases[name] = _PhaseStats()
+            stats.seconds += data['seconds']
+            stats.calls += data['calls']
+            if data.get('peak_kib') is not None:
+                self.memory = True
+                stats.peak_bytes = max(stats.peak_bytes, int(data['peak_kib'] * 1024))
+        if report.get('peak_kib') is not None:
+            self._peak_bytes = max(self._peak_bytes, int(report['peak_kib'] * 1024))
+        for name, value in report['counters'].items():
+            self.count(name, value)
+
+    def report(self):
+        total = self._elapsed
+        if self._started is not None:
+            total += time.perf_counter() - self._started
+        phases = {name: {'seconds': round(stats.seconds, 6), 'calls': stats.calls,
+                         'peak_kib': round(stats.peak_bytes / 1024, 1) if self.memory else None}
+                  for name, stats in self.phases.items()}
+        accounted = sum(stats.seconds for stats in self.phases.values())
+        result = {
+            'total_seconds': round(total, 6),
+            'phases': phases,
+            'other_seconds': round(max(total - accounted, 0.0), 6),
+            'counters': dict(sorted(self.counters.items())),
+        }
+        if self.memory:
+            peak = self._peak_bytes
+            if tracemalloc.is_tracing():
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+            result['peak_kib'] = round(peak / 1024, 1)
+        if self._profiler is not None:
+            result['profile'] = profile_top(self._profiler)
+        return result
+
+
+class NullInstrumentation:
+    """Выключенные замеры: тот же интерфейс, ничего не делает."""
+    enabled = False
+    _phase = nullcontext()
+
+    def start(self):
+        return self
+
+    def stop(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def phase(self, name):
+        return self._phase
+
+    def count(self, name, n=1):
+        pass
+
+    def report(self):
+        return None
+
+
+NULL = NullInstrumentation()
+
+
+def profile_top(profiler, limit=PROFILE_TOP):
+    """Самые затратные функции профиля по собственному времени: [{function, calls, own, cumulative}]."""
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, line, func), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({'function': f"{filename}:{line}({func})", 'calls': ncalls,
+                     'own_seconds': round(tottime, 6), 'cumulative_seconds': round(cumtime, 6)})
+    rows.sort(key=lambda row: row['own_seconds'], reverse=True)
+    return rows[:limit]
+
+
+def format_report(report):
+    """Текстовый вид отчета для окна: этапы по убыванию времени и счетчики."""
+    total = report['total_seconds'] or 1e-9
+    lines = [f"Всего: {report['total_seconds'] * 1000:.1f} мс"]
+    if report.get('peak_kib') is not None:
+        lines[0] += f", пиковая память {report['peak_kib']:.0f} КиБ"
+    phases = sorted(report['phases'].items(), key=lambda item: item[1]['seconds'], reverse=True)
+    phases.append(('other', {'seconds': report['other_seconds'], 'calls': None, 'peak_kib': None}))
+    for name, data in phases:
+        line = f"  {name:<8} {data['seconds'] * 1000:9.1f} мс {data['seconds'] / total:6.1%}"
+        if data['calls'] is not None:
+            line += f"  вызовов {data['calls']}"
+        if data['peak_kib'] is not None:
+            line += f"  пик {data['peak_kib']:.0f} КиБ"
+        lines.append(line)
+    for name, value in report['counters'].items():
+        lines.append(f"  {name}: {value}")
+    for row in report.get('profile', [])[:10]:
+        lines.append(f"  {row['own_seconds'] * 1000:8.1f} мс  {row['calls']:>8}  {row['function']}")
+    return '\n'.join(lines)
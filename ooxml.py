@@ -0,0 +1,56 @@
+"""Пространства имен WordprocessingML и поиск частей пакета .docx по связям."""
+import posixpath
+
+from lxml import etree
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+A_NS = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+RT_OFFICE_DOCUMENT = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+RT_STYLES = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles'
+RT_THEME = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/theme'
+RT_HEADER = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/header'
+RT_FOOTER = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/footer'
+
+
+def w(tag):
+    return f'{{{W_NS}}}{tag}'
+
+
+def a(tag):
+    return f'{{{A_NS}}}{tag}'
+
+
+def r(tag):
+    return f'{{{R_NS}}}{tag}'
+
+
+def read_rels(zf, part_name):
+    """{rId: (тип связи, имя части)} для внутренних связей части; '' — связи пакета."""
+    rels_name = posixpath.join(posixpath.dirname(part_name), '_rels', posixpath.basename(part_name) + '.rels')
+    try:
+        root = etree.fromstring(zf.read(rels_name))
+    except KeyError:
+        return {}
+    base = posixpath.dirname(part_name)
+    rels = {}
+    for rel in root.iterfind(f'{{{PKG_REL_NS}}}Relationship'):
+        if rel.get('TargetMode') == 'External':
+            continue
+        target = rel.get('Target')
+        target = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join(base, target))
+        rels[rel.get('Id')] = (rel.get('Type'), target)
+    return rels
+
+
+def related_part(rels, rel_type):
+    return next((target for target_type, target in rels.values() if target_type == rel_type), None)
+
+
+def locate_parts(zf):
+    """Имя основной части документа и ее связи."""
+    document_part = related_part(read_rels(zf, ''), RT_OFFICE_DOCUMENT) or 'word/document.xml'
+    return document_part, read_rels(zf, document_part)
+
@@ -0,0 +1,235 @@
+"""Дисковый кэш результатов проверки с адресацией по содержимому.
+
+Два уровня:
+  * документ — ключ по хэшу всех XML-частей пакета; неизмененный файл
+    (в том числе пересохраненный под другим именем) отдается сразу;
+  * абзац — ключ по XML абзаца, его виду (тело, таблица, колонтитул) и хэшу
+    стилей/темы; при повторной сдаче работы заново проверяются только
+    измененные абзацы.
+
+Оба ключа включают отпечаток набора профилей требований (RuleSet.fingerprint),
+поэтому результаты разных профилей хранятся рядом, а при правке профиля старые
+записи просто вытесняются. Весь кэш сбрасывается при смене CHECKS_VERSION.
+Объем каждого уровня ограничен, лишнее вытесняется по давности использования (LRU).
+Объем строки считается вместе с ключом и служебными данными SQLite, а текущий
+объем таблицы хранится в meta и меняется в той же транзакции, что и сами строки.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zipfile
+
+from checker_core import paragraph_report_from_dict, paragraph_report_to_dict
+from rule_profiles import CHECKS_VERSION
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'tusur-doc-checker')
+DEFAULT_MAX_DOCUMENT_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_PARAGRAPH_BYTES = 256 * 1024 * 1024
+
+_TABLES = ('documents', 'paragraphs')
+# Приблизительный объем строки в файле сверх ключа и результата: копия ключа
+# в индексе первичного ключа, индекс по last_used и служебные поля SQLite
+_ROW_OVERHEAD = 128
+# Наибольшее число ключей в одном запросе при записи и вытеснении
+_SQL_CHUNK = 500
+# Ошибки открытия каталога или файла кэша
+CACHE_ERRORS = (OSError, sqlite3.Error)
+
+
+def _row_size(key, payload):
+    return len(key) + len(payload.encode('utf-8')) + _ROW_OVERHEAD
+
+
+def _size_key(table):
+    """Ключ meta с текущим объемом таблицы (сумма size ее строк)."""
+    return f'size:{table}'
+
+
+def document_digest(zf):
+    """Хэш всех XML-частей пакета (без картинок и прочих бинарных вложений)."""
+    digest = hashlib.sha256()
+    for name in sorted(zf.namelist()):
+        if not name.endswith(('.xml', '.rels')):
+            continue
+        digest.update(name.encode('utf-8'))
+        digest.update(b'\0')
+        with zf.open(name) as part:
+            for chunk in iter(lambda: part.read(1 << 16), b''):
+                digest.update(chunk)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def parts_digest(*blobs):
+    """Хэш контекста стилей: styles.xml и тема (None — части нет)."""
+    digest = hashlib.sha256()
+    for blob in blobs:
+        digest.update(b'\0' if blob is None else blob)
+        digest.update(b'\1')
+    return digest.hexdigest()
+
+
+def _encode_document_report(report):
+    data = dict(report)
+    data.pop('path', None)
+    data['paragraphs'] = [paragraph_report_to_dict(p) for p in report['paragraphs']]
+    return json.dumps(data, ensure_ascii=False)
+
+
+def _decode_document_report(payload, doc_path):
+    data = json.loads(payload)
+    data['path'] = str(doc_path)
+    data['paragraphs'] = [paragraph_report_from_dict(p) for p in data['paragraphs']]
+    return data
+
+
+class ResultCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_document_bytes=DEFAULT_MAX_DOCUMENT_BYTES,
+                 max_paragraph_bytes=DEFAULT_MAX_PARAGRAPH_BYTES):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.checks_version = str(CHECKS_VERSION)
+        self._limits = {'documents': max_document_bytes, 'paragraphs': max_paragraph_bytes}
+        # Один файл могут открывать несколько процессов пакетной проверки
+        self._db = sqlite3.connect(os.path.join(cache_dir, 'results.sqlite3'), timeout=30)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            for table in _TABLES:
+                self._db.execute(f'CREATE TABLE IF NOT EXISTS {table} '
+                                 f'(key TEXT PRIMARY KEY, payload TEXT, size INTEGER, last_used REAL)')
+                self._db.execute(f'CREATE INDEX IF NOT EXISTS {table}_lru ON {table} (last_used)')
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'checks_version'").fetchone()
+            if row is None or row[0] != self.checks_version:
+                self._clear_locked()
+            for table in _TABLES:
+                if self._db.execute('SELECT 1 FROM meta WHERE key = ?', (_size_key(table),)).fetchone() is None:
+                    self._count_size_locked(table)
+        self._touched = {table: [] for table in _TABLES}
+        self._pending = {table: {} for table in _TABLES}
+
+    def _clear_locked(self):
+        for table in _TABLES:
+            self._db.execute(f'DELETE FROM {table}')
+            self._db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, 0)', (_size_key(table),))
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('checks_version', ?)",
+                         (self.checks_version,))
+
+    def _count_size_locked(self, table):
+        # Кэш, созданный до учета объема в meta: size пересчитывается по тем же правилам, что в flush
+        self._db.execute(f'UPDATE {table} SET size = length(key) + length(CAST(payload AS BLOB)) + ?',
+                         (_ROW_OVERHEAD,))
+        size = self._db.execute(f'SELECT COALESCE(SUM(size), 0) FROM {table}').fetchone()[0]
+        self._db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (_size_key(table), size))
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+    def _key(self, *parts):
+        return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+
+    def _get(self, table, key):
+        row = self._db.execute(f'SELECT payload FROM {table} WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        self._touched[table].append(key)
+        return row[0]
+
+    def _put(self, table, key, payload):
+        self._pending[table][key] = payload
+
+    def flush(self):
+        """Записывает накопленные результаты и отметки использования одной транзакцией."""
+        if not any(self._touched[table] or self._pending[table] for table in _TABLES):
+            return
+        now = time.time()
+        with self._db:
+            # Файл общий для всех процессов пакета: блокировка на запись берется сразу,
+            # чтобы объем в meta и строки таблиц менялись согласованно
+            self._db.execute('BEGIN IMMEDIATE')
+            for table in _TABLES:
+                touched, pending = self._touched[table], self._pending[table]
+                if touched:
+                    self._db.executemany(f'UPDATE {table} SET last_used = ? WHERE key = ?',
+                                         ((now, key) for key in touched))
+                if pending:
+                    rows = [(key, payload, _row_size(key, payload), now) for key, payload in pending.items()]
+                    # Запись мог уже добавить другой процесс: ее объем заменяется, а не прибавляется
+                    replaced = 0
+                    keys = list(pending)
+                    for start in range(0, len(keys), _SQL_CHUNK):
+                        chunk = keys[start:start + _SQL_CHUNK]
+                        marks = ','.join('?' * len(chunk))
+                        replaced += self._db.execute(f'SELECT COALESCE(SUM(size), 0) FROM {table} '
+                                                     f'WHERE key IN ({marks})', chunk).fetchone()[0]
+                    self._db.executemany(f'INSERT OR REPLACE INTO {table} (key, payload, size, last_used) '
+                                         f'VALUES (?, ?, ?, ?)', rows)
+                    total = self._add_size_locked(table, sum(row[2] for row in rows) - replaced)
+                    if total > self._limits[table]:
+                        self._evict_locked(table, total)
+                self._touched[table] = []
+                self._pending[table] = {}
+
+    def _add_size_locked(self, table, delta):
+        """Меняет объем таблицы в meta на delta и возвращает новое значение."""
+        self._db.execute('UPDATE meta SET value = CAST(value AS INTEGER) + ? WHERE key = ?',
+                         (delta, _size_key(table)))
+        return int(self._db.execute('SELECT value FROM meta WHERE key = ?', (_size_key(table),)).fetchone()[0])
+
+    def _evict_locked(self, table, total):
+        # Освобождаем с запасом в 10%, чтобы не вытеснять на каждой вставке;
+        # самые давние записи читаются порциями, а не всей таблицей
+        target = self._limits[table] * 0.9
+        freed = 0
+        while total - freed > target:
+            rows = self._db.execute(f'SELECT key, size FROM {table} ORDER BY last_used LIMIT ?',
+                                    (_SQL_CHUNK,)).fetchall()
+            if not rows:
+                break
+            victims = []
+            for key, size in rows:
+                if total - freed <= target:
+                    break
+                victims.append((key,))
+                freed += size
+            self._db.executemany(f'DELETE FROM {table} WHERE key = ?', victims)
+        self._add_size_locked(table, -freed)
+
+    def document_key(self, doc_path, rules_fingerprint):
+        with zipfile.ZipFile(doc_path) as zf:
+            return self._key('document', rules_fingerprint, document_digest(zf))
+
+    def get_document(self, key, doc_path):
+        payload = self._get('documents', key)
+        return None if payload is None else _decode_document_report(payload, doc_path)
+
+    def put_document(self, key, report):
+        self._put('documents', key, _encode_document_report(report))
+
+    def paragraph_key(self, paragraph_xml, style_digest, container, rules_fingerprint):
+        return self._key('paragraph', rules_fingerprint, style_digest, container,
+                         hashlib.sha256(paragraph_xml).hexdigest())
+
+    def get_paragraph(self, key, p_idx, location=None):
+        """Отчет по абзацу на позиции p_idx (и месте location) или None.
+
+        Для абзацев без замечаний по основному профилю — {'has_issues': False} и,
+        если профилей несколько, 'other_profiles'.
+        """
+        payload = self._get('paragraphs', key)
+        if payload is None:
+            return None
+        data = json.loads(payload)
+        if not data['has_issues']:
+            return data
+        return paragraph_report_from_dict(data, p_idx, location)
+
+    def put_paragraph(self, key, report):
+        if report['has_issues']:
+            data = paragraph_report_to_dict(report)
+        else:
+            data = {key: report[key] for key in ('has_issues', 'other_profiles') if key in report}
+        self._put('paragraphs', key, json.dumps(data, ensure_ascii=False))
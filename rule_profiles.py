@@ -0,0 +1,244 @@
+"""Профили требований к оформлению и их компиляция в проверки.
+
+Профили описываются в profiles.json (варианты ОС ТУСУР для разных факультетов);
+профиль может наследовать другой через "extends" и переопределять часть
+параметров. Каждый профиль компилируется один раз на процесс: допуски
+переводятся в EMU, названия правил межстрочного интервала и тексты требований
+готовятся заранее. RuleSet — несколько профилей, проверяемых за один проход
+по документу; подробный отчет строится по первому (основному) профилю.
+"""
+import hashlib
+import json
+import os
+from functools import lru_cache
+
+from docx.enum.text import WD_LINE_SPACING
+from docx.shared import Cm
+
+from traversal import CONTAINERS
+
+DEFAULT_PROFILES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles.json')
+
+# Увеличивать при изменении логики проверок: сбрасывает кэш результатов (result_cache.py)
+CHECKS_VERSION = 4
+
+_PROFILE_KEYS = ('title', 'font', 'size_pt', 'size_tolerance_pt', 'first_line_indent_cm', 'indent_tolerance_cm',
+                 'line_spacing', 'margins_cm', 'margin_tolerance_cm', 'font_in', 'paragraph_format_in')
+_MARGINS = (('top', 'top_margin', 'верхнее'), ('bottom', 'bottom_margin', 'нижнее'),
+            ('left', 'left_margin', 'левое'), ('right', 'right_margin', 'правое'))
+
+_SPACING_NAMES = {int(member): name for name, member in WD_LINE_SPACING.__members__.items()}
+# Правила, которые Word может записать и как MULTIPLE с тем же множителем
+_SPACING_MULTIPLES = {
+    WD_LINE_SPACING.SINGLE: (1.0, 'одинарный'),
+    WD_LINE_SPACING.ONE_POINT_FIVE: (1.5, 'полуторный'),
+    WD_LINE_SPACING.DOUBLE: (2.0, 'двойной'),
+}
+
+
+def _containers(name, key, values):
+    unknown = set(values) - set(CONTAINERS)
+    if unknown:
+        raise ValueError(f"Профиль '{name}': в {key} неизвестные значения {', '.join(sorted(unknown))} "
+                         f"(допустимо: {', '.join(CONTAINERS)})")
+    return frozenset(values)
+
+
+class CompiledProfile:
+    """Профиль, готовый к проверке: только сравнения чисел, без поиска по перечислениям."""
+    __slots__ = ('name', 'title', 'font', 'size_pt', 'size_tolerance_pt', 'indent_emu', 'indent_tolerance_emu',
+                 'line_spacing_rule', 'line_spacing_multiple', 'margins', 'margin_tolerance_emu', 'font_in',
+                 'paragraph_format_in', 'fingerprint',
+                 '_font_missing_msg', '_font_wrong_msg', '_size_missing_msg', '_size_wrong_msg',
+                 '_indent_missing_msg', '_indent_wrong_msg', '_spacing_msg')
+
+    def __init__(self, name, spec):
+        self.name = name
+        self.title = spec['title']
+        self.font = spec['font']
+        self.size_pt = float(spec['size_pt'])
+        self.size_tolerance_pt = float(spec['size_tolerance_pt'])
+        indent_cm = float(spec['first_line_indent_cm'])
+        self.indent_emu = int(Cm(indent_cm))
+        self.indent_tolerance_emu = int(Cm(spec['indent_tolerance_cm']))
+        try:
+            self.line_spacing_rule = WD_LINE_SPACING.__members__[spec['line_spacing']]
+        except KeyError:
+            raise ValueError(f"Профиль '{name}': неизвестное правило интервала '{spec['line_spacing']}' "
+                             f"(допустимо: {', '.join(WD_LINE_SPACING.__members__)})") from None
+        multiple = _SPACING_MULTIPLES.get(self.line_spacing_rule)
+        self.line_spacing_multiple = multiple[0] if multiple else None
+        margins_cm = spec['margins_cm']
+        missing = [key for key, _, _ in _MARGINS if key not in margins_cm]
+        if missing:
+            raise ValueError(f"Профиль '{name}': не заданы поля {', '.join(missing)}")
+        # (атрибут секции, название, требуемое значение в EMU, в см)
+        self.margins = tuple((attr, label, int(Cm(margins_cm[key])), float(margins_cm[key]))
+                             for key, attr, label in _MARGINS)
+        self.margin_tolerance_emu = int(Cm(spec['margin_tolerance_cm']))
+        # Где применяются правила шрифта и параметров абзаца (traversal.CONTAINERS)
+        self.font_in = _containers(name, 'font_in', spec['font_in'])
+        self.paragraph_format_in = _containers(name, 'paragraph_format_in', spec['paragraph_format_in'])
+        self.fingerprint = hashlib.sha256(
+            json.dumps([CHECKS_VERSION, spec], sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
+        self._font_missing_msg = f"неверный шрифт (должен быть '{self.font}')"
+        self._font_wrong_msg = f" (должен быть \"{self.font}\")"
+        self._size_missing_msg = f"неверный размер (должен быть {self.size_pt:.1f} пт)"
+        self._size_wrong_msg = f" пт (должен быть {self.size_pt:.1f} пт)"
+        self._indent_missing_msg = f"отступ первой строки не задан (нужен {indent_cm:.2f} см)"
+        self._indent_wrong_msg = f" см (нужен {indent_cm:.2f} см)"
+        self._spacing_msg = (f"межстрочный интервал не {multiple[1]}" if multiple else
+                             f"нужно: \"{_SPACING_NAMES[self.line_spacing_rule]}\"")
+
+    def font_ok(self, font_name, font_size_pt):
+        return (font_name == self.font and font_size_pt is not None and
+                abs(font_size_pt - self.size_pt) <= self.size_tolerance_pt)
+
+    def font_errors(self, run_text_segment, font_name, font_size_pt):
+        if not run_text_segment.strip() or self.font_ok(font_name, font_size_pt):
+            return []
+        errors = []
+        if font_name is None:
+            errors.append(self._font_missing_msg)
+        elif font_name != self.font:
+            errors.append(f"шрифт \"{font_name}\"{self._font_wrong_msg}")
+        if font_size_pt is None:
+            errors.append(self._size_missing_msg)
+        elif abs(font_size_pt - self.size_pt) > self.size_tolerance_pt:
+            errors.append(f"размер {font_size_pt:.1f}{self._size_wrong_msg}")
+        return errors
+
+    def indent_ok(self, indent):
+        if indent is None:
+            return self.indent_emu == 0
+        return abs(indent - self.indent_emu) <= self.indent_tolerance_emu
+
+    def spacing_ok(self, rule, value):
+        if rule == self.line_spacing_rule:
+            return True
+        return (self.line_spacing_multiple is not None and rule == WD_LINE_SPACING.MULTIPLE and
+                value is not None and abs(value - self.line_spacing_multiple) < 0.01)
+
+    def paragraph_errors(self, para_format):
+        """para_format — ParagraphFormat из python-docx или запись с теми же атрибутами
+        (first_line_indent, line_spacing_rule, line_spacing)."""
+        errors = []
+        indent = para_format.first_line_indent
+        if not self.indent_ok(indent):
+            if indent is None:
+                errors.append(self._indent_missing_msg)
+            else:
+                errors.append(f"отступ первой строки {indent.cm:.2f}{self._indent_wrong_msg}")
+
+        rule, value = para_format.line_spacing_rule, para_format.line_spacing
+        if not self.spacing_ok(rule, value):
+            rule_name = _SPACING_NAMES.get(rule, str(rule))
+            if self.line_spacing_multiple is not None:
+                errors.append(f"{self._spacing_msg} (тек. правило: {rule_name}, знач: {value})")
+            else:
+                errors.append(f"неверное правило межстрочного интервала (тек: \"{rule_name}\", {self._spacing_msg})")
+        return errors
+
+    def margin_ok(self, margin, target_emu):
+        return margin is not None and abs(margin - target_emu) <= self.margin_tolerance_emu
+
+    def margin_errors(self, section):
+        """section — Section из python-docx или запись с атрибутами *_margin (Length)."""
+        errors = []
+        for attr, label, target_emu, target_cm in self.margins:
+            margin = getattr(section, attr)
+            if self.margin_ok(margin, target_emu):
+                continue
+            if margin is None:
+                errors.append(f"{label} поле не задано (нужно {target_cm:.2f} см)")
+            else:
+                errors.append(f"{label} поле {margin.cm:.2f} см (нужно {target_cm:.2f} см)")
+        return errors
+
+    def paragraph_has_issues(self, para_format, logical_runs, container):
+        """Быстрый ответ «есть ли замечания» для дополнительных профилей.
+
+        logical_runs — уже склеенные (текст, шрифт, размер) с непустым текстом.
+        """
+        if container in self.font_in:
+            for _, font_name, font_size in logical_runs:
+                if not self.font_ok(font_name, font_size):
+                    return True
+        return container in self.paragraph_format_in and bool(self.paragraph_errors(para_format))
+
+
+class RuleSet:
+    """Профили, проверяемые за один проход; первый — основной."""
+
+    def __init__(self, profiles):
+        if not profiles:
+            raise ValueError("Не выбрано ни одного профиля требований")
+        self.profiles = tuple(profiles)
+        self.primary = self.profiles[0]
+        self.extra = self.profiles[1:]
+        self.names = tuple(profile.name for profile in self.profiles)
+        self.fingerprint = hashlib.sha256(
+            '\0'.join(profile.fingerprint for profile in self.profiles).encode('utf-8')).hexdigest()[:16]
+
+
+def _resolve_spec(name, raw_profiles, chain=()):
+    if name in chain:
+        raise ValueError(f"Профиль '{name}': циклическое наследование ({' -> '.join(chain + (name,))})")
+    try:
+        raw = raw_profiles[name]
+    except KeyError:
+        raise ValueError(f"Неизвестный профиль '{name}' (есть: {', '.join(raw_profiles)})") from None
+    unknown = set(raw) - set(_PROFILE_KEYS) - {'extends'}
+    if unknown:
+        raise ValueError(f"Профиль '{name}': неизвестные параметры {', '.join(sorted(unknown))}")
+    spec = dict(_resolve_spec(raw['extends'], raw_profiles, chain + (name,))) if 'extends' in raw else {}
+    spec.update((key, value) for key, value in raw.items() if key != 'extends')
+    return spec
+
+
+@lru_cache(maxsize=None)
+def _load_config(path):
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    raw_profiles = config.get('profiles', {})
+    profiles = {}
+    for name in raw_profiles:
+        spec = _resolve_spec(name, raw_profiles)
+        missing = [key for key in _PROFILE_KEYS if key not in spec]
+        if missing:
+            raise ValueError(f"Профиль '{name}': не заданы параметры {', '.join(missing)}")
+        profiles[name] = CompiledProfile(name, spec)
+    default = config.get('default') or next(iter(profiles), None)
+    if default not in profiles:
+        raise ValueError(f"Профиль по умолчанию '{default}' не описан в {path}")
+    return profiles, default
+
+
+def load_profiles(path=None):
+    """{имя: CompiledProfile} и имя профиля по умолчанию; файл читается один раз на процесс."""
+    return _load_config(os.path.abspath(path or DEFAULT_PROFILES_PATH))
+
+
+@lru_cache(maxsize=None)
+def _rule_set(names, path):
+    profiles, default = _load_config(path)
+    for name in names:
+        if name not in profiles:
+            raise ValueError(f"Неизвестный профиль '{name}' (есть: {', '.join(profiles)})")
+    return RuleSet([profiles[name] for name in (names or (default,))])
+
+
+def rule_set(names=None, path=None):
+    """RuleSet из профилей names (по умолчанию — профиль по умолчанию из файла)."""
+    return _rule_set(tuple(dict.fromkeys(names or ())), os.path.abspath(path or DEFAULT_PROFILES_PATH))
+
+
+@lru_cache(maxsize=None)
+def default_rule_set():
+    """RuleSet из профиля по умолчанию; вызывается на каждый абзац, поэтому запоминается."""
+    return rule_set()
+
+
+def default_profile():
+    return default_rule_set().primary
@@ -0,0 +1,155 @@
+"""Потоковый движок разбора .docx без объектной модели python-docx.
+
+word/document.xml читается из архива инкрементальным парсером (lxml.iterparse):
+каждый элемент верхнего уровня тела обходится traversal.BodyWalker, проверяется
+и сразу удаляется из дерева, поэтому пиковая память почти не зависит от длины
+документа. Колонтитулы (небольшие части) разбираются целиком по мере появления
+ссылок на них. Результат совпадает по формату и содержанию с checker_core.analyze_document.
+"""
+import zipfile
+
+from lxml import etree
+
+from checker_core import DocumentCheck, check_paragraph_element, count_findings, instrumented_paragraph_check
+from instrumentation import NULL
+from ooxml import RT_STYLES, RT_THEME, locate_parts, related_part, w
+from result_cache import parts_digest
+from rule_profiles import default_rule_set
+from style_resolver import StyleResolver
+from traversal import BodyWalker, container_of
+
+W_BODY, W_P, W_TBL, W_SDT, W_SECTPR = w('body'), w('p'), w('tbl'), w('sdt'), w('sectPr')
+
+
+class StreamingDocument:
+    """Открытый .docx: стили разобраны сразу, тело документа читается потоково."""
+
+    def __init__(self, doc_path):
+        self._zf = zipfile.ZipFile(doc_path)
+        try:
+            self.document_part, self.document_rels = locate_parts(self._zf)
+            document_rels = self.document_rels
+            self.styles_blob = _read_blob(self._zf, related_part(document_rels, RT_STYLES))
+            self.theme_blob = _read_blob(self._zf, related_part(document_rels, RT_THEME))
+            self.resolver = StyleResolver(
+                etree.fromstring(self.styles_blob) if self.styles_blob is not None else None,
+                etree.fromstring(self.theme_blob) if self.theme_blob is not None else None)
+        except Exception:
+            self._zf.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._zf.close()
+
+    @property
+    def zip_file(self):
+        """Открытый архив документа (autofix.py копирует из него нетронутые части)."""
+        return self._zf
+
+    def _load_part(self, r_id):
+        rel = self.document_rels.get(r_id)
+        blob = _read_blob(self._zf, rel[1]) if rel is not None else None
+        return etree.fromstring(blob) if blob is not None else None
+
+    def iter_body(self, walker=None):
+        """События traversal.BodyWalker по всему документу. Элемент абзаца
+        действителен только до следующего шага."""
+        walker = walker or BodyWalker(self._load_part)
+        with self._zf.open(self.document_part) as stream:
+            for _, elem in etree.iterparse(stream, events=('end',), tag=(W_P, W_TBL, W_SDT, W_SECTPR),
+                                           resolve_entities=False, huge_tree=True):
+                if elem.getparent().tag != W_BODY:
+                    continue
+                yield from walker.visit(elem)
+                _release(elem)
+
+    def walker(self):
+        return BodyWalker(self._load_part)
+
+
+def _read_blob(zf, part_name):
+    if part_name is None:
+        return None
+    try:
+        return zf.read(part_name)
+    except KeyError:
+        return None
+
+
+def _release(elem):
+    """Очищает обработанный элемент верхнего уровня и уже пройденных соседей."""
+    elem.clear()
+    parent = elem.getparent()
+    if parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
+
+
+def analyze_document(doc_path, cache=None, rules=None, on_paragraph=None, instrumentation=NULL):
+    """Аналог checker_core.analyze_document на потоковом разборе.
+
+    cache — result_cache.ResultCache: неизмененный документ отдается из кэша
+    целиком, а в измененном заново проверяются только новые/правленые абзацы.
+    rules — rule_profiles.RuleSet; все профили проверяются за один проход.
+    on_paragraph — как в checker_core.analyze_document; с кэшем отчеты по абзацам
+    все же накапливаются, потому что сохраняются в кэш вместе с документом.
+    instrumentation — instrumentation.Instrumentation для замеров по этапам.
+    """
+    rules = rules or default_rule_set()
+    doc_key = None
+    if cache is not None:
+        doc_key = cache.document_key(doc_path, rules.fingerprint)
+        cached = cache.get_document(doc_key, doc_path)
+        if cached is not None:
+            instrumentation.count('cache.document_hits')
+            if instrumentation.enabled:
+                for para_report in cached['paragraphs']:
+                    count_findings(instrumentation, para_report)
+                instrumentation.count('sections', cached['section_count'])
+                instrumentation.count('findings.page_margins', len(cached['section_margin_errors']))
+            cache.flush()
+            if on_paragraph is not None:
+                for para_report in cached['paragraphs']:
+                    on_paragraph(para_report)
+            return cached
+
+    check_paragraph = instrumented_paragraph_check(instrumentation) if instrumentation.enabled \
+        else check_paragraph_element
+    check = DocumentCheck(rules, on_paragraph, keep_paragraphs=on_paragraph is None or cache is not None)
+    with instrumentation.phase('open'):
+        doc = StreamingDocument(doc_path)
+    with doc:
+        style_digest = parts_digest(doc.styles_blob, doc.theme_blob) if cache is not None else None
+        walker = doc.walker()
+        for event in doc.iter_body(walker):
+            if event[0] == 'section':
+                check.add_section(event[2])
+                continue
+            _, p_idx, p, location = event
+            if cache is None:
+                report = check_paragraph(p_idx, p, location, doc.resolver, rules)
+            else:
+                para_key = cache.paragraph_key(etree.tostring(p), style_digest, container_of(location),
+                                               rules.fingerprint)
+                report = cache.get_paragraph(para_key, p_idx, location)
+                if report is None:
+                    report = check_paragraph(p_idx, p, location, doc.resolver, rules)
+                    cache.put_paragraph(para_key, report)
+                else:
+                    instrumentation.count('cache.paragraph_hits')
+                    instrumentation.count('paragraphs')
+                    if report['has_issues']:
+                        count_findings(instrumentation, report)
+            check.add_paragraph(report)
+
+    report = check.document_report(doc_path, walker.paragraph_count, instrumentation)
+    if cache is not None:
+        cache.put_document(doc_key, report)
+        cache.flush()
+    return report
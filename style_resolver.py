@@ -0,0 +1,142 @@
+"""Эффективный шрифт фрагмента с учетом всей цепочки наследования стилей.
+
+Порядок применения (от общего к частному): docDefaults -> абзацный стиль с его
+цепочкой basedOn -> символьный стиль с его цепочкой -> прямое форматирование w:r.
+Темы (asciiTheme="minorHAnsi" и т.п.) разворачиваются в имя шрифта из theme1.xml.
+
+Разбор цепочки дорогой, а различных комбинаций в документе единицы, поэтому
+результат кэшируется по ключу (стиль абзаца, стиль символа, прямые свойства):
+для каждого w:r остается один поиск в словаре.
+"""
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.simpletypes import ST_HpsMeasure
+from lxml import etree
+
+from ooxml import a, w
+
+W_VAL = w('val')
+W_RFONTS, W_SZ, W_RSTYLE = w('rFonts'), w('sz'), w('rStyle')
+W_ASCII, W_ASCII_THEME = w('ascii'), w('asciiTheme')
+
+_TRUE_VALUES = ('1', 'true', 'on')
+
+
+def direct_font_props(rPr):
+    """(rFonts/@ascii, rFonts/@asciiTheme, sz/@val) как строки из XML; None — не задано."""
+    if rPr is None:
+        return None, None, None
+    rFonts = rPr.find(W_RFONTS)
+    sz = rPr.find(W_SZ)
+    return (rFonts.get(W_ASCII) if rFonts is not None else None,
+            rFonts.get(W_ASCII_THEME) if rFonts is not None else None,
+            sz.get(W_VAL) if sz is not None else None)
+
+
+def run_style_id(rPr):
+    if rPr is None:
+        return None
+    rStyle = rPr.find(W_RSTYLE)
+    return rStyle.get(W_VAL) if rStyle is not None else None
+
+
+def _theme_fonts(theme_root):
+    fonts = {}
+    if theme_root is None:
+        return fonts
+    for kind in ('major', 'minor'):
+        latin = theme_root.find(f'.//{a("fontScheme")}/{a(kind + "Font")}/{a("latin")}')
+        if latin is not None and latin.get('typeface'):
+            fonts[kind] = latin.get('typeface')
+    return fonts
+
+
+class StyleResolver:
+    def __init__(self, styles_root=None, theme_root=None):
+        self._theme_fonts = _theme_fonts(theme_root)
+        self._styles = {}  # styleId -> (тип, basedOn, (ascii, asciiTheme, sz))
+        self._default_style = {}  # тип -> styleId стиля по умолчанию
+        self._doc_defaults = (None, None, None)
+        self._style_cache = {}
+        self._font_cache = {}
+        if styles_root is None:
+            return
+        rPr_default = styles_root.find(f'{w("docDefaults")}/{w("rPrDefault")}/{w("rPr")}')
+        self._doc_defaults = direct_font_props(rPr_default)
+        for style in styles_root.iterfind(w('style')):
+            style_id = style.get(w('styleId'))
+            style_type = style.get(w('type'), 'paragraph')
+            based_on = style.find(w('basedOn'))
+            self._styles[style_id] = (style_type,
+                                      based_on.get(W_VAL) if based_on is not None else None,
+                                      direct_font_props(style.find(w('rPr'))))
+            if style.get(w('default')) in _TRUE_VALUES:
+                self._default_style[style_type] = style_id
+
+    @classmethod
+    def from_document(cls, document):
+        """Резолвер для документа, открытого через python-docx."""
+        try:
+            theme_root = etree.fromstring(document.part.part_related_by(RT.THEME).blob)
+        except KeyError:
+            theme_root = None
+        return cls(document.styles.element, theme_root)
+
+    def _font_name(self, ascii_name, ascii_theme):
+        if ascii_theme is not None:
+            theme_font = self._theme_fonts.get('major' if ascii_theme.startswith('major') else 'minor')
+            if theme_font is not None:
+                return theme_font
+        return ascii_name
+
+    def _style_font(self, style_id, style_type):
+        """(шрифт, размер в полупунктах) стиля с учетом basedOn; None — не задано в цепочке."""
+        key = (style_id, style_type)
+        if key in self._style_cache:
+            return self._style_cache[key]
+        chain = []
+        seen = set()
+        current = style_id
+        while current is not None and current not in seen:
+            style = self._styles.get(current)
+            if style is None or style[0] != style_type:
+                break
+            seen.add(current)
+            chain.append(style[2])
+            current = style[1]
+        font_name = size = None
+        for ascii_name, ascii_theme, sz in reversed(chain):
+            font_name = self._font_name(ascii_name, ascii_theme) or font_name
+            size = sz if sz is not None else size
+        self._style_cache[key] = (font_name, size)
+        return font_name, size
+
+    def _paragraph_style_id(self, style_id):
+        # Как в Word и python-docx: неизвестный или пустой id — стиль абзаца по умолчанию
+        style = self._styles.get(style_id) if style_id is not None else None
+        if style is None or style[0] != 'paragraph':
+            return self._default_style.get('paragraph')
+        return style_id
+
+    def effective_font(self, p_style_id, r_style_id, rPr):
+        """(имя шрифта, размер в пт) фрагмента; None — не удалось определить."""
+        key = (p_style_id, r_style_id) + direct_font_props(rPr)
+        try:
+            return self._font_cache[key]
+        except KeyError:
+            pass
+        _, _, direct_ascii, direct_theme, direct_sz = key
+        if r_style_id is None:
+            r_style_id = self._default_style.get('character')
+        levels = (
+            (self._font_name(self._doc_defaults[0], self._doc_defaults[1]), self._doc_defaults[2]),
+            self._style_font(self._paragraph_style_id(p_style_id), 'paragraph'),
+            self._style_font(r_style_id, 'character'),
+            (self._font_name(direct_ascii, direct_theme), direct_sz),
+        )
+        font_name = size = None
+        for level_font, level_size in levels:
+            font_name = level_font or font_name
+            size = level_size if level_size is not None else size
+        result = (font_name, ST_HpsMeasure.convert_from_xml(size).pt if size is not None else None)
+        self._font_cache[key] = result
+        return result
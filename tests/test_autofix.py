@@ -0,0 +1,57 @@
+"""Исправленная копия: повторная проверка без замечаний, остальные части архива не тронуты."""
+import zipfile
+
+import docx
+import pytest
+
+import stream_engine
+from autofix import fix_document
+from benchmarks.generate_docs import generate_document
+from checker_core import count_issues
+from findings import RULE_FONT, RULE_MARGINS, RULE_PARAGRAPH
+
+DOCUMENT_PART = 'word/document.xml'
+
+
+@pytest.fixture
+def source(tmp_path):
+    return generate_document(str(tmp_path / 'source.docx'), paragraphs=300, runs_per_paragraph=6,
+                             table_every=40, violation_rate=0.3, sections=4, headers=True)
+
+
+def test_fixed_copy_has_no_findings(source, tmp_path):
+    assert count_issues(stream_engine.analyze_document(source)) > 0
+    target = str(tmp_path / 'fixed.docx')
+
+    result = fix_document(source, target)
+
+    assert all(result['fixes'][rule] > 0 for rule in (RULE_FONT, RULE_PARAGRAPH, RULE_MARGINS))
+    report = stream_engine.analyze_document(target)
+    assert report['section_count'] == 4
+    assert count_issues(report) == 0
+    docx.Document(target)
+
+
+def test_untouched_parts_are_identical(source, tmp_path):
+    target = str(tmp_path / 'fixed.docx')
+    result = fix_document(source, target)
+
+    with zipfile.ZipFile(source) as src, zipfile.ZipFile(target) as dst:
+        assert dst.namelist() == src.namelist()
+        changed = {DOCUMENT_PART, *result['parts']}
+        assert result['parts']
+        for info in src.infolist():
+            copy = dst.getinfo(info.filename)
+            assert (copy.date_time, copy.compress_type) == (info.date_time, info.compress_type)
+            if info.filename not in changed:
+                assert copy.CRC == info.CRC
+                assert dst.read(info.filename) == src.read(info.filename), info.filename
+
+
+def test_source_is_never_overwritten(source):
+    with open(source, 'rb') as f:
+        original = f.read()
+    with pytest.raises(ValueError):
+        fix_document(source, source)
+    with open(source, 'rb') as f:
+        assert f.read() == original
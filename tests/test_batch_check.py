@@ -0,0 +1,36 @@
+"""Пул пакетной проверки: аварийное завершение исполнителя не прерывает пакет."""
+import io
+import os
+
+from batch_check import run_pool
+
+
+def _task(path):
+    if path == 'crash.docx':
+        os._exit(1)
+    return {'path': path, 'status': 'pass', 'issues': 0, 'paragraph_count': 0, 'error': None, 'profiles': {},
+            'elapsed': 0.0}
+
+
+def test_worker_crash_fails_only_running_files():
+    paths = [f'{i}.docx' for i in range(8)]
+    paths.insert(3, 'crash.docx')
+    out = io.StringIO()
+
+    results = run_pool(_task, [(path,) for path in paths], jobs=1, out=out)
+
+    status = {result['path']: result['status'] for result in results}
+    assert status == dict.fromkeys(paths, 'pass') | {'crash.docx': 'error'}
+    assert out.getvalue().count('\n') == len(paths)
+
+
+def test_worker_crash_with_parallel_workers():
+    paths = [f'{i}.docx' for i in range(20)] + ['crash.docx']
+
+    results = run_pool(_task, [(path,) for path in paths], jobs=4, out=io.StringIO())
+
+    status = {result['path']: result['status'] for result in results}
+    assert sorted(status) == sorted(paths)
+    assert status['crash.docx'] == 'error'
+    # Ошибкой помечаются не больше файлов, чем было в работе одновременно с упавшим
+    assert sum(s == 'error' for s in status.values()) <= 4
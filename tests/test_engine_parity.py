@@ -0,0 +1,99 @@
+"""Оба движка разбора (и потоковый с кэшем) дают один и тот же отчет."""
+import os
+import zipfile
+
+import pytest
+
+import checker_core
+import stream_engine
+from benchmarks.generate_docs import generate_document
+from checker_core import paragraph_report_to_dict
+from instrumentation import Instrumentation
+from result_cache import ResultCache
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      'Простой документ для проверки.docx')
+
+
+def _comparable(report):
+    return dict(report, paragraphs=[paragraph_report_to_dict(p) for p in report['paragraphs']])
+
+
+@pytest.fixture(params=['sample', 'generated'])
+def document(request, tmp_path):
+    if request.param == 'sample':
+        return SAMPLE
+    return generate_document(str(tmp_path / 'generated.docx'), paragraphs=400, runs_per_paragraph=6,
+                             table_every=30, violation_rate=0.3, sections=3, headers=True)
+
+
+def test_engines_agree(document):
+    expected = _comparable(checker_core.analyze_document(document))
+    assert expected['paragraphs']
+    assert _comparable(stream_engine.analyze_document(document)) == expected
+
+
+def test_cached_reports_agree(document, tmp_path):
+    expected = _comparable(checker_core.analyze_document(document))
+    cache = ResultCache(str(tmp_path / 'cache'))
+    try:
+        # Первый проход заполняет кэш, второй берет документ из него целиком
+        for _ in range(2):
+            assert _comparable(stream_engine.analyze_document(document, cache=cache)) == expected
+    finally:
+        cache.close()
+
+
+def _edit_first_paragraph(src, dst):
+    """Копия документа, в которой изменен текст одного абзаца."""
+    with zipfile.ZipFile(src) as zin, zipfile.ZipFile(dst, 'w', zipfile.ZIP_DEFLATED) as zout:
+        for info in zin.infolist():
+            data = zin.read(info)
+            if info.filename == 'word/document.xml':
+                start = data.index(b'<w:t')
+                end = data.index(b'</w:t>', start)
+                data = data[:end] + 'исправлено'.encode('utf-8') + data[end:]
+            zout.writestr(info, data)
+    return dst
+
+
+def test_reused_paragraphs_agree(tmp_path):
+    source = generate_document(str(tmp_path / 'v1.docx'), paragraphs=400, runs_per_paragraph=6,
+                               table_every=30, violation_rate=0.3, sections=3, headers=True)
+    edited = _edit_first_paragraph(source, str(tmp_path / 'v2.docx'))
+    cache = ResultCache(str(tmp_path / 'cache'))
+    try:
+        stream_engine.analyze_document(source, cache=cache)
+        instr = Instrumentation()
+        report = stream_engine.analyze_document(edited, cache=cache, instrumentation=instr)
+    finally:
+        cache.close()
+    assert instr.counters.get('cache.paragraph_hits', 0) > 0
+    assert 'cache.document_hits' not in instr.counters
+    assert _comparable(report) == _comparable(checker_core.analyze_document(edited))
+
+
+def test_cached_counters_agree(tmp_path):
+    source = generate_document(str(tmp_path / 'v1.docx'), paragraphs=400, runs_per_paragraph=6,
+                               table_every=30, violation_rate=0.3, sections=3, headers=True)
+    edited = _edit_first_paragraph(source, str(tmp_path / 'v2.docx'))
+    expected = Instrumentation()
+    stream_engine.analyze_document(edited, instrumentation=expected)
+    cache = ResultCache(str(tmp_path / 'cache'))
+    try:
+        stream_engine.analyze_document(source, cache=cache)
+        # Абзацы из кэша и документ из кэша целиком
+        runs = [Instrumentation(), Instrumentation()]
+        for instr in runs:
+            stream_engine.analyze_document(edited, cache=cache, instrumentation=instr)
+    finally:
+        cache.close()
+
+    def counters(instr, *names):
+        return {name: value for name, value in instr.counters.items() if name.startswith(names)}
+
+    assert runs[0].counters['cache.paragraph_hits'] > 0
+    assert runs[1].counters['cache.document_hits'] == 1
+    assert counters(runs[0], 'paragraphs', 'findings.', 'sections') == \
+        counters(expected, 'paragraphs', 'findings.', 'sections')
+    assert counters(runs[1], 'findings.', 'sections') == counters(expected, 'findings.', 'sections')
@@ -0,0 +1,146 @@
+"""Эффективный шрифт фрагмента: docDefaults, тема, цепочки basedOn и прямое форматирование."""
+import zipfile
+
+import pytest
+from lxml import etree
+
+import checker_core
+import stream_engine
+from benchmarks.generate_docs import CONTENT_TYPES, DOCUMENT_RELS, PACKAGE_RELS
+from findings import RULE_FONT, document_findings
+from style_resolver import StyleResolver, direct_font_props, run_style_id
+from traversal import paragraph_records
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+THEME = '''<a:theme xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" name="Test"><a:themeElements>
+<a:fontScheme name="Test"><a:majorFont><a:latin typeface="Cambria"/></a:majorFont>
+<a:minorFont><a:latin typeface="Times New Roman"/></a:minorFont></a:fontScheme>
+</a:themeElements></a:theme>'''
+
+# docDefaults: шрифт из темы (minorHAnsi -> Times New Roman), 11 пт
+DOC_DEFAULTS = ('<w:docDefaults><w:rPrDefault><w:rPr><w:rFonts w:asciiTheme="minorHAnsi"/><w:sz w:val="22"/>'
+                '</w:rPr></w:rPrDefault></w:docDefaults>')
+
+STYLES = DOC_DEFAULTS + '''
+<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:rPr><w:sz w:val="28"/></w:rPr></w:style>
+<w:style w:type="paragraph" w:styleId="Base"><w:basedOn w:val="Normal"/>
+  <w:rPr><w:rFonts w:ascii="Arial"/></w:rPr></w:style>
+<w:style w:type="paragraph" w:styleId="Middle"><w:basedOn w:val="Base"/>
+  <w:rPr><w:rFonts w:ascii="Times New Roman"/></w:rPr></w:style>
+<w:style w:type="paragraph" w:styleId="Leaf"><w:basedOn w:val="Middle"/><w:rPr><w:sz w:val="24"/></w:rPr></w:style>
+<w:style w:type="paragraph" w:styleId="Heading"><w:basedOn w:val="Normal"/>
+  <w:rPr><w:rFonts w:asciiTheme="majorHAnsi"/></w:rPr></w:style>
+<w:style w:type="paragraph" w:styleId="LoopA"><w:basedOn w:val="LoopB"/></w:style>
+<w:style w:type="paragraph" w:styleId="LoopB"><w:basedOn w:val="LoopA"/><w:rPr><w:sz w:val="30"/></w:rPr></w:style>
+<w:style w:type="character" w:default="1" w:styleId="DefaultParagraphFont"/>
+<w:style w:type="character" w:styleId="Accent"><w:rPr><w:rFonts w:ascii="Courier New"/></w:rPr></w:style>
+<w:style w:type="character" w:styleId="SmallAccent"><w:basedOn w:val="Accent"/>
+  <w:rPr><w:sz w:val="20"/></w:rPr></w:style>
+'''
+
+
+def _styles(body):
+    return etree.fromstring(f'<w:styles xmlns:w="{W_NS}">{body}</w:styles>')
+
+
+def _rPr(xml):
+    return etree.fromstring(f'<w:rPr xmlns:w="{W_NS}">{xml}</w:rPr>') if xml else None
+
+
+@pytest.fixture
+def resolver():
+    return StyleResolver(_styles(STYLES), etree.fromstring(THEME))
+
+
+@pytest.mark.parametrize('p_style, r_style, direct, expected', [
+    # docDefaults и стиль абзаца по умолчанию (без pStyle и с неизвестным id)
+    (None, None, '', ('Times New Roman', 14.0)),
+    ('Missing', None, '', ('Times New Roman', 14.0)),
+    # Цепочка basedOn: ближний стиль перекрывает дальний, незаданное наследуется
+    ('Base', None, '', ('Arial', 14.0)),
+    ('Middle', None, '', ('Times New Roman', 14.0)),
+    ('Leaf', None, '', ('Times New Roman', 12.0)),
+    # Тема в стиле абзаца
+    ('Heading', None, '', ('Cambria', 14.0)),
+    # Цикл basedOn не зацикливает разбор
+    ('LoopA', None, '', ('Times New Roman', 15.0)),
+    # Символьный стиль и его цепочка поверх стиля абзаца
+    ('Middle', 'Accent', '', ('Courier New', 14.0)),
+    ('Leaf', 'SmallAccent', '', ('Courier New', 10.0)),
+    # Прямое форматирование перекрывает каждый уровень
+    (None, None, '<w:rFonts w:ascii="Arial"/><w:sz w:val="24"/>', ('Arial', 12.0)),
+    ('Leaf', None, '<w:sz w:val="28"/>', ('Times New Roman', 14.0)),
+    ('Base', None, '<w:rFonts w:ascii="Times New Roman"/>', ('Times New Roman', 14.0)),
+    ('Middle', 'SmallAccent', '<w:rFonts w:ascii="Times New Roman"/><w:sz w:val="28"/>', ('Times New Roman', 14.0)),
+    ('Base', None, '<w:rFonts w:asciiTheme="minorHAnsi"/>', ('Times New Roman', 14.0)),
+    ('Heading', 'Accent', '<w:rFonts w:ascii="Arial" w:asciiTheme="minorHAnsi"/>', ('Times New Roman', 14.0)),
+])
+def test_effective_font(resolver, p_style, r_style, direct, expected):
+    rPr = _rPr(direct)
+    assert resolver.effective_font(p_style, r_style, rPr) == expected
+    # Второй вызов — из кэша резолвера
+    assert resolver.effective_font(p_style, r_style, rPr) == expected
+
+
+def test_theme_without_font_falls_back_to_ascii():
+    resolver = StyleResolver(_styles(DOC_DEFAULTS), None)
+    assert resolver.effective_font(None, None, None) == (None, 11.0)
+    assert resolver.effective_font(None, None, _rPr('<w:rFonts w:ascii="Arial" w:asciiTheme="minorHAnsi"/>')) == \
+        ('Arial', 11.0)
+
+
+def test_run_properties_from_xml():
+    rPr = _rPr('<w:rStyle w:val="Accent"/><w:rFonts w:ascii="Arial" w:asciiTheme="majorHAnsi"/><w:sz w:val="24"/>')
+    assert run_style_id(rPr) == 'Accent'
+    assert direct_font_props(rPr) == ('Arial', 'majorHAnsi', '24')
+    assert run_style_id(None) is None
+    assert direct_font_props(None) == (None, None, None)
+
+
+def test_paragraph_records_use_paragraph_and_character_styles(resolver):
+    p = etree.fromstring(
+        f'<w:p xmlns:w="{W_NS}"><w:pPr><w:pStyle w:val="Leaf"/></w:pPr>'
+        '<w:r><w:t>основной </w:t></w:r>'
+        '<w:r><w:rPr><w:rStyle w:val="SmallAccent"/></w:rPr><w:t>код</w:t></w:r>'
+        '<w:r><w:rPr><w:sz w:val="28"/></w:rPr><w:t> текст</w:t></w:r></w:p>')
+    text, _, run_fonts = paragraph_records(p, resolver)
+    assert text == 'основной код текст'
+    assert run_fonts == [('основной ', 'Times New Roman', 12.0), ('код', 'Courier New', 10.0),
+                         (' текст', 'Times New Roman', 14.0)]
+
+
+# Документ, где верный шрифт задан только через тему, docDefaults и стили
+DOCUMENT = f'''<w:document xmlns:w="{W_NS}"><w:body>
+<w:p><w:r><w:t>Шрифт из темы и docDefaults, размер из стиля Normal.</w:t></w:r></w:p>
+<w:p><w:pPr><w:pStyle w:val="Middle"/></w:pPr><w:r><w:t>Шрифт из цепочки basedOn.</w:t></w:r></w:p>
+<w:p><w:pPr><w:pStyle w:val="Base"/></w:pPr>
+  <w:r><w:rPr><w:rFonts w:asciiTheme="minorHAnsi"/></w:rPr><w:t>Тема в прямом форматировании.</w:t></w:r></w:p>
+<w:p><w:pPr><w:pStyle w:val="Leaf"/></w:pPr>
+  <w:r><w:rPr><w:sz w:val="28"/></w:rPr><w:t>Размер перекрыт прямо.</w:t></w:r></w:p>
+<w:p><w:r><w:rPr><w:rStyle w:val="SmallAccent"/></w:rPr><w:t>Символьный стиль.</w:t></w:r></w:p>
+<w:p><w:r><w:rPr><w:rStyle w:val="SmallAccent"/><w:rFonts w:ascii="Times New Roman"/><w:sz w:val="28"/></w:rPr>
+  <w:t>Символьный стиль перекрыт прямо.</w:t></w:r></w:p>
+<w:sectPr><w:pgMar w:top="1134" w:right="850" w:bottom="1134" w:left="1701"/></w:sectPr>
+</w:body></w:document>'''
+
+
+@pytest.fixture
+def styled_document(tmp_path):
+    path = str(tmp_path / 'styles.docx')
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', CONTENT_TYPES.format(overrides=''))
+        zf.writestr('_rels/.rels', PACKAGE_RELS)
+        zf.writestr('word/_rels/document.xml.rels', DOCUMENT_RELS.format(relationships=''))
+        zf.writestr('word/styles.xml', etree.tostring(_styles(STYLES)))
+        zf.writestr('word/theme/theme1.xml', THEME)
+        zf.writestr('word/document.xml', DOCUMENT)
+    return path
+
+
+@pytest.mark.parametrize('engine', [checker_core.analyze_document, stream_engine.analyze_document])
+def test_only_wrong_fonts_are_reported(styled_document, engine):
+    report = engine(styled_document)
+    font_findings = [record for record in document_findings(report['path'], report) if record['rule'] == RULE_FONT]
+    assert [record['paragraph'] for record in font_findings] == [5]
+    assert 'Courier New' in font_findings[0]['message']
@@ -0,0 +1,31 @@
+"""Нумерация абзацев при обходе: тело — как document.paragraphs, ячейки — внутри ячейки."""
+import docx
+
+from benchmarks.generate_docs import generate_document
+from checker_core import part_element_loader
+from ooxml import w
+from traversal import BodyWalker
+
+
+def test_paragraph_numbering(tmp_path):
+    path = generate_document(str(tmp_path / 'tables.docx'), paragraphs=120, runs_per_paragraph=3,
+                             table_every=10, violation_rate=0.3)
+    document = docx.Document(path)
+    walker = BodyWalker(part_element_loader(document))
+    body, cells = [], {}
+    for event in walker.walk(document.element.body):
+        if event[0] != 'paragraph':
+            continue
+        _, p_idx, p, location = event
+        if location['part'] != 'body':
+            continue
+        if location['tables']:
+            cells.setdefault(str(location['tables']), []).append(p_idx)
+        else:
+            body.append((p_idx, p))
+
+    assert cells
+    assert [p for _, p in body] == [para._p for para in document.paragraphs]
+    assert [p_idx for p_idx, _ in body] == list(range(len(document.paragraphs)))
+    assert all(indexes == list(range(len(indexes))) for indexes in cells.values())
+    assert walker.paragraph_count == sum(1 for _ in document.element.body.iter(w('p')))
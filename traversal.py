@@ -0,0 +1,256 @@
+"""Обход документа за один проход: тело, таблицы любой вложенности, колонтитулы и все секции.
+
+BodyWalker получает элементы верхнего уровня w:body по одному (из потокового
+разбора или из готового дерева python-docx) и отдает события в порядке документа:
+  ('paragraph', p_idx, w:p, location) — абзац тела, ячейки таблицы или колонтитула;
+    p_idx — номер абзаца с 0 среди абзацев тела (как в document.paragraphs python-docx),
+    части колонтитула или ячейки: абзацы ячеек нумеруются внутри ячейки, а сама
+    ячейка указана в location;
+  ('section', section_no, SectionRecord, w:sectPr) — конец очередной секции.
+Колонтитулы секции обходятся, когда встречается ее w:sectPr; часть, на которую
+ссылаются несколько секций, обходится один раз. location — словарь
+{'part': 'body' | 'header' | 'footer', 'section': номер секции с 1,
+ 'tables': [[таблица, строка, ячейка], ...] от внешней таблицы к вложенной}.
+Здесь же — извлечение легких записей из w:p и w:sectPr, общее для движков.
+"""
+from docx.enum.text import WD_LINE_SPACING
+from docx.oxml.simpletypes import ST_SignedTwipsMeasure, ST_TwipsMeasure
+from docx.shared import Length, Twips
+
+from ooxml import r, w
+from style_resolver import run_style_id
+
+W_BODY, W_P, W_R, W_TBL, W_SECTPR = w('body'), w('p'), w('r'), w('tbl'), w('sectPr')
+W_PPR, W_RPR, W_HYPERLINK = w('pPr'), w('rPr'), w('hyperlink')
+W_VAL, W_TYPE = w('val'), w('type')
+
+W_RUN_T, W_RUN_BR, W_RUN_CR, W_RUN_NB_HYPHEN = w('t'), w('br'), w('cr'), w('noBreakHyphen')
+_RUN_TEXT_TAGS = {W_RUN_T, W_RUN_BR, W_RUN_CR, W_RUN_NB_HYPHEN, w('tab'), w('ptab')}
+
+
+class ParagraphFormatRecord:
+    """Прямые параметры абзаца с той же семантикой, что у docx ParagraphFormat."""
+    __slots__ = ('first_line_indent', 'line_spacing_rule', 'line_spacing')
+
+    def __init__(self, first_line_indent, line_spacing_rule, line_spacing):
+        self.first_line_indent = first_line_indent
+        self.line_spacing_rule = line_spacing_rule
+        self.line_spacing = line_spacing
+
+
+class SectionRecord:
+    __slots__ = ('top_margin', 'bottom_margin', 'left_margin', 'right_margin')
+
+    def __init__(self, top_margin, bottom_margin, left_margin, right_margin):
+        self.top_margin = top_margin
+        self.bottom_margin = bottom_margin
+        self.left_margin = left_margin
+        self.right_margin = right_margin
+
+
+def _attr(elem, name, simple_type):
+    if elem is None:
+        return None
+    value = elem.get(w(name))
+    return None if value is None else simple_type.convert_from_xml(value)
+
+
+def paragraph_format_record(pPr):
+    if pPr is None:
+        return ParagraphFormatRecord(None, None, None)
+    first_line_indent = None
+    ind = pPr.find(w('ind'))
+    if ind is not None:
+        hanging = _attr(ind, 'hanging', ST_TwipsMeasure)
+        first_line_indent = Length(-hanging) if hanging is not None else _attr(ind, 'firstLine', ST_TwipsMeasure)
+
+    line_spacing_rule = line_spacing = None
+    spacing = pPr.find(w('spacing'))
+    if spacing is not None:
+        line = _attr(spacing, 'line', ST_SignedTwipsMeasure)
+        rule_xml = spacing.get(w('lineRule'))
+        rule = WD_LINE_SPACING.from_xml(rule_xml) if rule_xml is not None else None
+        if rule is None and line is not None:
+            rule = WD_LINE_SPACING.MULTIPLE
+        if line is not None:
+            line_spacing = line / Twips(240) if rule == WD_LINE_SPACING.MULTIPLE else line
+        line_spacing_rule = rule
+        if rule == WD_LINE_SPACING.MULTIPLE:
+            line_spacing_rule = {Twips(240): WD_LINE_SPACING.SINGLE,
+                                 Twips(360): WD_LINE_SPACING.ONE_POINT_FIVE,
+                                 Twips(480): WD_LINE_SPACING.DOUBLE}.get(line, rule)
+    return ParagraphFormatRecord(first_line_indent, line_spacing_rule, line_spacing)
+
+
+def section_record(sectPr):
+    pgMar = sectPr.find(w('pgMar'))
+    return SectionRecord(_attr(pgMar, 'top', ST_SignedTwipsMeasure),
+                         _attr(pgMar, 'bottom', ST_SignedTwipsMeasure),
+                         _attr(pgMar, 'left', ST_TwipsMeasure),
+                         _attr(pgMar, 'right', ST_TwipsMeasure))
+
+
+def run_text(r):
+    parts = []
+    for child in r:
+        tag = child.tag
+        if tag not in _RUN_TEXT_TAGS:
+            continue
+        if tag == W_RUN_T:
+            parts.append(child.text or '')
+        elif tag == W_RUN_BR:
+            if child.get(W_TYPE, 'textWrapping') == 'textWrapping':
+                parts.append('\n')
+        elif tag == W_RUN_CR:
+            parts.append('\n')
+        elif tag == W_RUN_NB_HYPHEN:
+            parts.append('-')
+        else:
+            parts.append('\t')
+    return ''.join(parts)
+
+
+def paragraph_records(p, resolver):
+    """Текст абзаца, его ParagraphFormatRecord и (текст, шрифт, размер) по прямым w:r."""
+    pPr = p.find(W_PPR)
+    pStyle = pPr.find(w('pStyle')) if pPr is not None else None
+    p_style_id = pStyle.get(W_VAL) if pStyle is not None else None
+
+    text_parts = []
+    run_fonts = []
+    for child in p:
+        if child.tag == W_R:
+            text = run_text(child)
+            rPr = child.find(W_RPR)
+            font_name, font_size = resolver.effective_font(p_style_id, run_style_id(rPr), rPr)
+            run_fonts.append((text, font_name, font_size))
+            text_parts.append(text)
+        elif child.tag == W_HYPERLINK:
+            text_parts.extend(run_text(r) for r in child.iterfind(W_R))
+    return ''.join(text_parts), paragraph_format_record(pPr), run_fonts
+
+
+W_SDT, W_SDT_CONTENT, W_TR, W_TC = w('sdt'), w('sdtContent'), w('tr'), w('tc')
+W_HEADER_REF, W_FOOTER_REF = w('headerReference'), w('footerReference')
+R_ID = r('id')
+
+PART_BODY, PART_HEADER, PART_FOOTER = 'body', 'header', 'footer'
+# Вид содержимого для правил профиля: абзацы таблиц тела отделены от основного текста
+CONTAINER_BODY, CONTAINER_TABLE = 'body', 'table'
+CONTAINERS = (CONTAINER_BODY, CONTAINER_TABLE, PART_HEADER, PART_FOOTER)
+
+_PART_TITLES = {PART_HEADER: 'верхний колонтитул', PART_FOOTER: 'нижний колонтитул'}
+
+
+def container_of(location):
+    if location is None:
+        return CONTAINER_BODY
+    if location['part'] == PART_BODY:
+        return CONTAINER_TABLE if location['tables'] else CONTAINER_BODY
+    return location['part']
+
+
+def location_label(location):
+    """Место абзаца для человека: «таблица 2, строка 1, ячейка 3», «нижний колонтитул раздела 2»."""
+    if location is None:
+        return ''
+    parts = []
+    if location['part'] != PART_BODY:
+        parts.append(f"{_PART_TITLES[location['part']]} раздела {location['section']}")
+    elif location['section'] > 1:
+        parts.append(f"раздел {location['section']}")
+    parts.extend(f"таблица {table}, строка {row}, ячейка {cell}" for table, row, cell in location['tables'])
+    return ' › '.join(parts)
+
+
+def _content(parent):
+    """Дочерние элементы с раскрытыми элементами управления содержимым (w:sdt)."""
+    for child in parent:
+        if child.tag == W_SDT:
+            sdt_content = child.find(W_SDT_CONTENT)
+            if sdt_content is not None:
+                yield from _content(sdt_content)
+        else:
+            yield child
+
+
+class _Scope:
+    """Нумерация абзацев и таблиц внутри тела, одной части колонтитула или одной ячейки.
+
+    root — область верхнего уровня (тело или часть); ее total считает все абзацы,
+    включая абзацы ячеек.
+    """
+    __slots__ = ('part', 'paragraphs', 'tables', 'root', 'total')
+
+    def __init__(self, part, root=None):
+        self.part = part
+        self.paragraphs = 0
+        self.tables = 0
+        self.root = root or self
+        self.total = 0
+
+
+class BodyWalker:
+    """Обход тела и колонтитулов; load_part(r:id) возвращает корень части или None."""
+
+    def __init__(self, load_part):
+        self._load_part = load_part
+        self._body = _Scope(PART_BODY)
+        self._visited_parts = set()
+        self.section_no = 1
+
+    @property
+    def paragraph_count(self):
+        """Абзацев тела (включая абзацы таблиц), пройденных к этому моменту."""
+        return self._body.total
+
+    def walk(self, body):
+        for elem in body:
+            yield from self.visit(elem)
+
+    def visit(self, elem):
+        """События для одного элемента верхнего уровня w:body."""
+        if elem.tag == W_SECTPR:
+            # Последняя секция документа: w:sectPr прямо в w:body
+            yield from self._section(elem)
+        else:
+            yield from self._blocks((elem,), self._body, [])
+
+    def walk_part(self, root, part):
+        """События для корня части колонтитула (part — PART_HEADER или PART_FOOTER)."""
+        yield from self._blocks(root, _Scope(part), [])
+
+    def _blocks(self, elements, scope, tables):
+        for elem in _content(elements):
+            tag = elem.tag
+            if tag == W_P:
+                location = {'part': scope.part, 'section': self.section_no, 'tables': tables}
+                yield ('paragraph', scope.paragraphs, elem, location)
+                scope.paragraphs += 1
+                scope.root.total += 1
+                if scope is self._body:
+                    # w:sectPr в свойствах абзаца закрывает секцию
+                    pPr = elem.find(W_PPR)
+                    sectPr = pPr.find(W_SECTPR) if pPr is not None else None
+                    if sectPr is not None:
+                        yield from self._section(sectPr)
+            elif tag == W_TBL:
+                scope.tables += 1
+                for row_no, tr in enumerate((e for e in _content(elem) if e.tag == W_TR), 1):
+                    for cell_no, tc in enumerate((e for e in _content(tr) if e.tag == W_TC), 1):
+                        yield from self._blocks(tc, _Scope(scope.part, scope.root),
+                                                tables + [[scope.tables, row_no, cell_no]])
+
+    def _section(self, sectPr):
+        yield ('section', self.section_no, section_record(sectPr), sectPr)
+        for ref in sectPr:
+            if ref.tag not in (W_HEADER_REF, W_FOOTER_REF):
+                continue
+            r_id = ref.get(R_ID)
+            if r_id is None or r_id in self._visited_parts:
+                continue
+            self._visited_parts.add(r_id)
+            root = self._load_part(r_id)
+            if root is not None:
+                yield from self.walk_part(root, PART_HEADER if ref.tag == W_HEADER_REF else PART_FOOTER)
+        self.section_no += 1